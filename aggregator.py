@@ -0,0 +1,92 @@
+"""Merge several QTM or replay publishers into one time-aligned stream."""
+
+import json
+import os
+import time
+
+import zmq
+
+from utils.client import decode_message
+from utils.fanin import FrameAligner
+
+# Comma separated publisher endpoints; the first one is the primary source.
+AGGREGATOR_SOURCES = os.environ.get(
+    "AGGREGATOR_SOURCES", "tcp://127.0.0.1:5555,tcp://127.0.0.1:5565"
+)
+AGGREGATOR_BIND = os.environ.get("AGGREGATOR_BIND", "tcp://*:5575")
+
+
+def connect_sources(context: zmq.Context, sources: list[str]) -> list[zmq.Socket]:
+    """Subscribe to every source endpoint."""
+    sockets = []
+    for endpoint in sources:
+        socket = context.socket(zmq.SUB)
+        socket.connect(endpoint)
+        socket.setsockopt_string(zmq.SUBSCRIBE, "")
+        sockets.append(socket)
+        print(f"Subscribed to {endpoint}")
+    return sockets
+
+
+def aggregate(
+    sockets: list[zmq.Socket],
+    publisher: zmq.Socket,
+    aligner: FrameAligner,
+    duration: float = None,
+):
+    """Poll all sources from one loop and publish merged frames.
+
+    Args:
+        sockets (list[zmq.Socket]): subscriber sockets, in source order.
+        publisher (zmq.Socket): PUB socket for merged frames.
+        aligner (FrameAligner): alignment state.
+        duration (float, optional): stop after this many seconds, run forever when None.
+    """
+    poller = zmq.Poller()
+    for socket in sockets:
+        poller.register(socket, zmq.POLLIN)
+    index = {socket: i for i, socket in enumerate(sockets)}
+
+    # Wake up often enough to flush primary frames whose wait expired.
+    timeout = max(int(aligner.max_wait * 500), 1)
+    end = None if duration is None else time.monotonic() + duration
+
+    while end is None or time.monotonic() < end:
+        events = poller.poll(timeout)
+        now = time.monotonic()
+
+        for socket, _ in events:
+            # Drain everything queued on this socket before merging.
+            while True:
+                try:
+                    message = socket.recv(flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                try:
+                    rt_data = decode_message(message, socket, "full")
+                except ValueError as error:
+                    print(f"An error occurred while decoding JSON: {error}")
+                    continue
+                aligner.add(index[socket], rt_data, now)
+
+        for merged in aligner.pop_ready(time.monotonic()):
+            publisher.send_string(json.dumps(merged))
+
+
+if __name__ == "__main__":
+    sources = [endpoint.strip() for endpoint in AGGREGATOR_SOURCES.split(",")]
+
+    context = zmq.Context()
+    sockets = connect_sources(context, sources)
+    publisher = context.socket(zmq.PUB)
+    publisher.bind(AGGREGATOR_BIND)
+    print(f"Publishing merged stream on {AGGREGATOR_BIND}")
+
+    aligner = FrameAligner(len(sources))
+
+    try:
+        aggregate(sockets, publisher, aligner)
+    except KeyboardInterrupt:
+        print(f"Aggregator metrics: {aligner.metrics()}")
+        print("Exiting...")
+        exit(0)
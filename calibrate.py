@@ -1,79 +1,86 @@
 import json
-import numpy as np
-from utils.labels import (
-    RIGHT_COM_LABELS,
-    LEFT_COM_LABELS,
-    RIGHT_SHOULDER_LABELS,
-    LEFT_SHOULDER_LABELS,
+from utils.pipeline import (
+    build_pipeline,
+    load_config,
+    run_pipeline,
 )
 
 from utils.client import (
+    SequenceTracker,
     setup_client_logger,
-    get_qrt_data,
     connect_to_publisher,
 )
 
+# Shared with the sequence stage so stream completeness can be reported on exit.
+tracker = SequenceTracker()
 
-def main():
-    client_logger = setup_client_logger()
-    socket = connect_to_publisher(logger=client_logger)
 
-    try:
-        while True:
-            frame_number, markers, _ = get_qrt_data(logger=client_logger, socket=socket)
-            if frame_number is None or len(markers) == 0:
-                continue
+def calibration_config() -> list:
+    """Return the shared client pipeline (``PIPELINE_CONFIG``) set up for calibration.
 
-            print(f"Received frame {frame_number}, {len(markers)} markers")
+    The sequence stage is wired to ``tracker`` (and added after decode if the config has
+    none), and the analytics stage is appended if the config does not run it. Configs
+    without the stages analytics depends on are rejected by ``build_pipeline``.
+    """
+    config = load_config()
+    names = [entry["stage"] for entry in config]
 
-            # Get the center of mass and shoulder positions for the right and left arms.
-            left_com_pos = np.mean(
-                np.array([markers[i][:3] for i in LEFT_COM_LABELS]), axis=0
-            )
-            right_com_pos = np.mean(
-                np.array([markers[i][:3] for i in RIGHT_COM_LABELS]), axis=0
-            )
+    if "sequence" not in names:
+        position = names.index("decode") + 1 if "decode" in names else 0
+        config.insert(position, {"stage": "sequence"})
+    for entry in config:
+        if entry["stage"] == "sequence":
+            entry["params"] = {**entry.get("params", {}), "tracker": tracker}
 
-            # Get the shoulder positions for the right and left arms.
-            left_shoulder_pos = np.mean(
-                np.array([markers[i][:3] for i in LEFT_SHOULDER_LABELS]), axis=0
-            )
-            right_shoulder_pos = np.mean(
-                np.array([markers[i][:3] for i in RIGHT_SHOULDER_LABELS]), axis=0
-            )
+    if "analytics" not in names:
+        config.append({"stage": "analytics"})
+    return config
 
-            # Calculate the arm length and offset for the right and left arms.
-            left_arm_length = np.linalg.norm(left_com_pos - left_shoulder_pos)
-            right_arm_length = np.linalg.norm(right_com_pos - right_shoulder_pos)
 
-            arm_length = np.mean([left_arm_length, right_arm_length])
+def save_calibration(batch: dict):
+    """Print and save the calibration values computed for the latest frame."""
+    print(f"Received frame {batch['frame_numbers'][-1]}, {batch['markers'].shape[1]} markers")
 
-            # Calculate the offset of the center of mass from the shoulder for the right and left arms.
-            left_offset = left_com_pos[1] - left_shoulder_pos[1]
-            right_offset = right_com_pos[1] - right_shoulder_pos[1]
+    data = batch["calibration"]
 
-            print("-" * 25)
-            print(f"Left Offset: {left_offset}")
-            print(f"Right Offset: {right_offset}")
-            print(f"Left Arm Length: {left_arm_length}")
-            print(f"Right Arm Length: {right_arm_length}")
-            print(f"Arm Length: {arm_length}")
-            print("-" * 25)
+    print("-" * 25)
+    print(f"Left Offset: {data['left_offset']}")
+    print(f"Right Offset: {data['right_offset']}")
+    print(f"Left Arm Length: {data['left_arm_length']}")
+    print(f"Right Arm Length: {data['right_arm_length']}")
+    print(f"Arm Length: {data['arm_length']}")
+    print("-" * 25)
 
-            data = {
-                "left_arm_length": left_arm_length,
-                "right_arm_length": right_arm_length,
-                "arm_length": arm_length,
-                "left_offset": left_offset,
-                "right_offset": right_offset,
-            }
+    # Save the calibration data to a file.
+    with open("calibration.json", "w") as f:
+        f.write(json.dumps(data))
 
-            # Save the calibration data to a file.
-            with open("calibration.json", "w") as f:
-                f.write(json.dumps(data))
+
+def main():
+    client_logger = setup_client_logger()
+    socket = connect_to_publisher(logger=client_logger)
+
+    # The shared client stages plus analytics, then save.
+    pipeline = build_pipeline(
+        calibration_config(), logger=client_logger, save=save_calibration
+    )
+
+    try:
+        run_pipeline(pipeline, socket)
 
     except KeyboardInterrupt:
         print("Exiting...")
+        for name, timing in pipeline.timings().items():
+            client_logger.info(f"{name}: {timing}")
+
+        # Calibration from an incomplete stream may be skewed; make that visible.
+        metrics = tracker.metrics()
+        client_logger.info(f"Stream metrics: {metrics}")
+        if not tracker.complete or metrics["duplicates"] or metrics["reordered"]:
+            print(
+                f"Warning: stream was incomplete ({metrics['missing']} missing, "
+                f"{metrics['duplicates']} duplicate, {metrics['reordered']} reordered frames)"
+            )
         socket.close()
         exit(0)
 
@@ -1,41 +1,74 @@
-"""Replay a sample C3D file as a fake real-time Qualisys marker stream."""
+"""Replay a sample C3D file as a fake real-time Qualisys marker stream.
+
+The trial is indexed once (see ``utils/trials.py``), so playback can start at any frame,
+time or swing cycle without replaying the beginning of the trial.
+"""
 
-import json
 import os
 import time
 
-import c3d
 import zmq
 
+from utils.tiers import TierPublisher
+from utils.trials import load_trial
+
 FPS = int(os.environ.get("DEMO_FPS", "40"))
 FRAME_STEP = int(os.environ.get("DEMO_FRAME_STEP", "5"))
 PUBLISH_BIND = os.environ.get("PUBLISH_BIND", "tcp://*:5555")
 C3D_PATH = os.environ.get("DEMO_C3D_PATH", "data/arm_swing.c3d")
+# Where to start playback; the first one set wins. Cycles count from 0, negative from the end.
+START_FRAME = os.environ.get("DEMO_START_FRAME")
+START_TIME = os.environ.get("DEMO_START_TIME")
+START_CYCLE = os.environ.get("DEMO_START_CYCLE")
+# Number of swing cycles to play from START_CYCLE; 0 plays to the end of the trial.
+CYCLES = int(os.environ.get("DEMO_CYCLES", "0"))
 
 
-def publish_packet(frame: int, markers: list):
+def publish_packet(frame: int, markers: list, timestamp: float = None):
     print(f"Replay frame {frame} ({len(markers)} markers)")
 
-    markers = markers.tolist()
-    markers = [[marker[0], marker[1], marker[2]] for marker in markers]
-    marker_json = json.dumps({"frame_number": frame, "markers": markers})
-    publisher.send_string(marker_json)
+    publisher.publish(frame, markers[:, :3], timestamp)
+
+
+def playback_range(trial) -> tuple:
+    """Rows of the trial to replay, from the DEMO_START_* settings.
+
+    Seeking by cycle in a trial without detected cycles replays the whole trial.
+    """
+    if START_FRAME is not None:
+        return trial.frame_index(int(START_FRAME)), len(trial)
+    if START_TIME is not None:
+        return trial.time_index(float(START_TIME)), len(trial)
+    if START_CYCLE is not None and len(trial.cycles) == 0:
+        print("Warning: no swing cycles detected in the trial, replaying from frame 0")
+        return 0, len(trial)
+    if START_CYCLE is not None:
+        cycle = int(START_CYCLE) % len(trial.cycles)
+        start, _ = trial.cycle_range(cycle)
+        if not CYCLES:
+            return start, len(trial)
+        last = min(cycle + CYCLES, len(trial.cycles)) - 1
+        return start, trial.cycle_range(last)[1]
+    return 0, len(trial)
 
 
 if __name__ == "__main__":
     context = zmq.Context()
-    publisher = context.socket(zmq.PUB)
-    publisher.bind(PUBLISH_BIND)
-    print(f"Publishing demo marker stream on {PUBLISH_BIND}")
+    publisher = TierPublisher(context, PUBLISH_BIND, frame_step=FRAME_STEP)
+
+    trial = load_trial(C3D_PATH)
+    start, end = playback_range(trial)
+    print(
+        f"Replaying frames {trial.frame_number(start)}-{trial.frame_number(end - 1)} "
+        f"({len(trial.cycles)} swing cycles in trial)"
+    )
 
-    with open(C3D_PATH, "rb") as c3d_file:
-        reader = c3d.Reader(c3d_file)
-        frames = reader.read_frames()
+    frame_numbers, positions, _ = trial.frames(start, end)
 
-        delay = 1 / FPS
-        for i, points, _ in frames:
-            if i % FRAME_STEP != 0:
-                continue
+    delay = 1 / FPS
+    for i, points in zip(frame_numbers, positions):
+        if i % FRAME_STEP != 0:
+            continue
 
-            publish_packet(i, points)
-            time.sleep(delay)
+        publish_packet(int(i), points, i / trial.rate)
+        time.sleep(delay)
@@ -1,18 +1,18 @@
 import json
+import time
 import numpy as np
 import matplotlib.pyplot as plt
-from utils.labels import (
-    RIGHT_COM_LABELS,
-    LEFT_COM_LABELS,
-    RIGHT_SHOULDER_LABELS,
-    LEFT_SHOULDER_LABELS,
-)
 from utils.client import (
     setup_client_logger,
-    get_qrt_data,
     connect_to_publisher,
 )
+from utils.pipeline import (
+    build_pipeline,
+    run_pipeline,
+)
 from utils.blit import BlitManager
+from utils.feedback import FeedbackEngine, load_protocol
+from utils import trace
 
 
 SWING_ANGLE = 160  # Desired swing angle (in degrees based on a bearing). So 0° is straight up, 90° is straight out.
@@ -24,48 +24,6 @@ right_arm_length = None
 arm_length = None
 left_offset = None
 right_offset = None
-swing_amplitude = None
-
-
-def calc_target_pos(arm: str, direction: str):
-    """Calculate the target position for the center of mass for the forward and backward swing.
-
-    Args:
-        arm (str): Which arm to calculate the target position for.
-        direction (str): The direction of the swing (forward or backward).
-
-    Returns:
-        np.array: The target position for the center of mass.
-    """
-
-    x = (
-        SEPARATE_CONSTANT + right_offset
-        if arm == "right"
-        else -SEPARATE_CONSTANT + left_offset
-    )
-    y = swing_amplitude if direction == "forward" else -swing_amplitude
-    pos = np.array([x, y])
-
-    return pos
-
-
-def update_com_pos(com_plot, shoulder, com, arm: str):
-    """Update the center of mass position on the plot.
-
-    Args:
-        com_plot (matplotlib plot): The plot of the center of mass.
-        shoulder (np.array): The shoulder position.
-        com (np.array): The center of mass position.
-        arm (str): The arm to update the center of mass for.
-    """
-    sep_constant = 100 if arm == "right" else -100
-
-    # Calculate the center of mass position relative to the shoulder position.
-    com[0] = com[0] - shoulder[0] + sep_constant
-    com[1] = com[1] - shoulder[1]
-
-    # Update the center of mass position.
-    com_plot.set_data([com[0]], [com[1]])
 
 
 def load_calibration():
@@ -91,21 +49,21 @@ def load_calibration():
         print("No calibration file found")
 
 
-def main():
-    """Main function to run the 2D arm swing visualization."""
+def draw_targets(target_plots: list, feedback: FeedbackEngine):
+    """Move the target circles of both arms to the current protocol step."""
+    for arm, target_plot in enumerate(target_plots):
+        targets = feedback.targets[feedback.step, arm]
+        target_plot.set_data(targets[:, 0], targets[:, 1])
 
-    # Load calibration and initialize variables.
-    load_calibration()
 
-    # Set the swing amplitude based on the desired swing angle and calibrated arm length (avg of left and right).
-    global swing_amplitude
-    swing_amplitude = np.sin(np.radians(SWING_ANGLE)) * arm_length
+def create_plot(feedback: FeedbackEngine) -> tuple:
+    """Create the figure and its artists.
 
-    # Connect to the publisher.
-    client_logger = setup_client_logger()
-    socket = connect_to_publisher(logger=client_logger)
+    Targets and the angle are static background artists, everything else is animated.
 
-    # Set up the plot.
+    Returns:
+        tuple: (figure, dict of artists; ``animated`` lists the ones to blit every frame)
+    """
     fig, ax = plt.subplots(figsize=(8, 8))
 
     ax.set_xlim(-250, 250)
@@ -113,9 +71,9 @@ def main():
     ax.set_aspect("equal")
     ax.set_xlabel("X")
     ax.set_ylabel("Y")
-    ax.set_title(f"2D Arm Swing Visualization - Angle: {SWING_ANGLE}°")
+    ax.set_title("2D Arm Swing Visualization")
 
-    # Display the packet number in the top left.
+    # Display the packet number in the top left, and the angle, error and score below it.
     packet_number_plot = ax.annotate(
         "0",
         (0, 1),
@@ -126,121 +84,179 @@ def main():
         va="top",
         animated=True,
     )
+    angle_plot = ax.annotate(
+        f"angle: {feedback.angle:g}°",
+        (0, 1),
+        xycoords="axes fraction",
+        xytext=(10, -28),
+        textcoords="offset points",
+        ha="left",
+        va="top",
+    )
+    error_plot = ax.annotate(
+        "",
+        (0, 1),
+        xycoords="axes fraction",
+        xytext=(10, -46),
+        textcoords="offset points",
+        ha="left",
+        va="top",
+        animated=True,
+    )
+    score_plot = ax.annotate(
+        "hits R: 0  L: 0  misses R: 0  L: 0",
+        (0, 1),
+        xycoords="axes fraction",
+        xytext=(10, -64),
+        textcoords="offset points",
+        ha="left",
+        va="top",
+        animated=True,
+    )
 
-    # Calculate where to plot the center of mass targets for the forward and backward swing.
-    rf_target_pos = calc_target_pos("right", "forward")
-    rb_target_pos = calc_target_pos("right", "backward")
-    lf_target_pos = calc_target_pos("left", "forward")
-    lb_target_pos = calc_target_pos("left", "backward")
-
-    # Display the center of masses for the arms and the target center of masses for the forward and backward swing.
+    # Display the trails and center of masses for the arms.
+    (right_trail_plot,) = ax.plot([], [], "r-", alpha=0.4, animated=True)
+    (left_trail_plot,) = ax.plot([], [], "b-", alpha=0.4, animated=True)
     (left_com_plot,) = ax.plot(0, 0, "bo", markersize=20, animated=True)
     (right_com_plot,) = ax.plot(0, 0, "ro", markersize=20, animated=True)
 
-    # Plot the target center of masses for the forward and backward swing.
-    ax.plot(
-        lf_target_pos[0],
-        lf_target_pos[1],
-        "bo",  # Blue circle
-        markerfacecolor="none",
-        markeredgecolor="b",
-        markersize=40,
-        alpha=0.7,
-    )
-    ax.plot(
-        lb_target_pos[0],
-        lb_target_pos[1],
-        "bo",
-        markerfacecolor="none",
-        markeredgecolor="b",
-        markersize=40,
-        alpha=0.7,
-    )
-    ax.plot(
-        rf_target_pos[0],
-        rf_target_pos[1],
-        "ro",  # Red circle
-        markerfacecolor="none",
-        markeredgecolor="r",
-        markersize=40,
-        alpha=0.7,
-    )
-    ax.plot(
-        rb_target_pos[0],
-        rb_target_pos[1],
-        "ro",
-        markerfacecolor="none",
-        markeredgecolor="r",
-        markersize=40,
-        alpha=0.7,
-    )
+    # Plot the target center of masses for the forward and backward swing, one artist per arm.
+    # They only move when the protocol step changes, so they are drawn with the background.
+    target_plots = []
+    for color in ("r", "b"):
+        (target_plot,) = ax.plot(
+            [],
+            [],
+            f"{color}o",  # Red / blue circles
+            markerfacecolor="none",
+            markeredgecolor=color,
+            markersize=40,
+            alpha=0.7,
+            linestyle="none",
+        )
+        target_plots.append(target_plot)
+
+    draw_targets(target_plots, feedback)
+
+    artists = {
+        "packet_number": packet_number_plot,
+        "angle": angle_plot,
+        "error": error_plot,
+        "score": score_plot,
+        "trails": (right_trail_plot, left_trail_plot),
+        "coms": (right_com_plot, left_com_plot),
+        "targets": target_plots,
+    }
+    artists["animated"] = [
+        packet_number_plot,
+        error_plot,
+        score_plot,
+        right_trail_plot,
+        left_trail_plot,
+        left_com_plot,
+        right_com_plot,
+    ]
+    return fig, artists
+
 
-    # Initialize the blitting manager to only update changed artists on rerenders.
-    bm = BlitManager(
-        fig.canvas,
-        [
-            packet_number_plot,
-            left_com_plot,
-            right_com_plot,
-        ],
+def main():
+    """Main function to run the 2D arm swing visualization."""
+
+    # Load calibration and initialize variables.
+    load_calibration()
+
+    # Precompute the targets of every protocol step from the calibrated arm length (avg of left and right).
+    protocol = load_protocol(SWING_ANGLE)
+    feedback = FeedbackEngine(
+        protocol, arm_length, right_offset, left_offset, SEPARATE_CONSTANT
     )
 
+    # Connect to the publisher.
+    client_logger = setup_client_logger()
+    socket = connect_to_publisher(logger=client_logger)
+
+    # Set up the plot and its artists.
+    fig, artists = create_plot(feedback)
+    packet_number_plot = artists["packet_number"]
+    angle_plot = artists["angle"]
+    error_plot = artists["error"]
+    score_plot = artists["score"]
+    right_trail_plot, left_trail_plot = artists["trails"]
+    right_com_plot, left_com_plot = artists["coms"]
+
+    # Initialize the blitting manager to only update changed artists on rerenders. Targets and
+    # the angle are static between protocol steps, so they stay in the background.
+    bm = BlitManager(fig.canvas, artists["animated"])
+
     plt.ion()  # Turn on interactive mode
     plt.show(block=False)
 
     # Pause for some time to ensure that at least 1 frame is displayed and cached for future renders.
     plt.pause(0.1)
 
-    packet_number = 0
-
-    try:
-        # Continuously fetch data from the publisher and update the plot.
-        while True:
-            frame_number, markers, _ = get_qrt_data(logger=client_logger, socket=socket)
-            if frame_number is None or len(markers) == 0:
-                continue
-
-            packet_number = frame_number
-            print(f"Received frame {packet_number}, {len(markers)} markers")
-
-            # Get the shoulder and center of mass points for the right and left arms.
-            right_shoulder_points = [markers[i][:3] for i in RIGHT_SHOULDER_LABELS]
-            right_com_points = [markers[i][:3] for i in RIGHT_COM_LABELS]
-            left_shoulder_points = [markers[i][:3] for i in LEFT_SHOULDER_LABELS]
-            left_com_points = [markers[i][:3] for i in LEFT_COM_LABELS]
-
-            # Average the shoulder and center of mass points to get the center of mass for the right and left arms.
-            right_shoulder = np.mean(right_shoulder_points, axis=0)
-            right_com = np.mean(right_com_points, axis=0)
-            left_shoulder = np.mean(left_shoulder_points, axis=0)
-            left_com = np.mean(left_com_points, axis=0)
-
-            # Flip the x and y axes, and then reflect the y axis to get the correct orientation.
-            # We need to do this to plot the arms correctly (show the swings vertically) as the markers are using different axes.
-            right_shoulder[0], right_shoulder[1] = right_shoulder[1], -right_shoulder[0]
-            right_com[0], right_com[1] = right_com[1], -right_com[0]
-            left_shoulder[0], left_shoulder[1] = left_shoulder[1], -left_shoulder[0]
-            left_com[0], left_com[1] = left_com[1], -left_com[0]
-
-            # Update the center of mass positions on the plot.
-            update_com_pos(
-                right_com_plot,
-                right_shoulder,
-                right_com,
-                "right",
+    # The protocol clock starts with the first frame drawn, not while waiting for the stream.
+    start_time = None
+    shown_error = None
+
+    def draw_frame(batch: dict):
+        """Render the latest frame of the batch."""
+        nonlocal shown_error, start_time
+        if start_time is None:
+            start_time = time.monotonic()
+        packet_number = batch["frame_numbers"][-1]
+        print(f"Received frame {packet_number}, {batch['markers'].shape[1]} markers")
+
+        with trace.span("plot.feedback", int(packet_number)):
+            # Center of mass of both arms relative to their shoulders, as (right, left) rows.
+            shoulder = np.stack(
+                (batch["right_shoulder_xy"][-1], batch["left_shoulder_xy"][-1])
             )
-            update_com_pos(
-                left_com_plot,
-                left_shoulder,
-                left_com,
-                "left",
+            com = np.stack((batch["right_com_xy"][-1], batch["left_com_xy"][-1]))
+            com = feedback.com_positions(shoulder, com)
+
+            step_changed, scored = feedback.update(com, time.monotonic() - start_time)
+
+        # Update the center of mass positions and trails on the plot.
+        right_com_plot.set_data([com[0, 0]], [com[0, 1]])
+        left_com_plot.set_data([com[1, 0]], [com[1, 1]])
+        right_trail = feedback.trail_xy(0)
+        left_trail = feedback.trail_xy(1)
+        right_trail_plot.set_data(right_trail[:, 0], right_trail[:, 1])
+        left_trail_plot.set_data(left_trail[:, 0], left_trail[:, 1])
+
+        # Text and targets are only touched when their content changes; the background
+        # holding the targets is redrawn once per protocol step.
+        if step_changed:
+            draw_targets(artists["targets"], feedback)
+            angle_plot.set_text(f"angle: {feedback.angle:g}°")
+            bm.refresh_background()
+
+        error = tuple(np.round(feedback.error()).astype(int))
+        if error != shown_error:
+            shown_error = error
+            error_plot.set_text(f"error R: {error[0]}  L: {error[1]}")
+
+        if scored:
+            right_hits, left_hits = feedback.hits.sum(axis=1)
+            right_misses, left_misses = feedback.misses.sum(axis=1)
+            score_plot.set_text(
+                f"hits R: {right_hits}  L: {left_hits}  "
+                f"misses R: {right_misses}  L: {left_misses}"
             )
 
-            # Update and render the packet number.
-            packet_number_plot.set_text(f"packet: {packet_number}")
+        # Update and render the packet number.
+        packet_number_plot.set_text(f"packet: {packet_number}")
 
-            # Blitting manager only updates changed artists
-            bm.update()
+        # Blitting manager only redraws moving artists and text whose content changed.
+        bm.update()
+
+    # Shoulder and center of mass points are averaged per arm and rotated into the plot frame
+    # by the pipeline (decode -> label_map -> filter -> kinematics) before being drawn.
+    pipeline = build_pipeline(logger=client_logger, draw=draw_frame)
+
+    try:
+        # Continuously fetch data from the publisher and update the plot.
+        run_pipeline(pipeline, socket)
 
     except KeyboardInterrupt:
         print("Exiting...")
@@ -0,0 +1,115 @@
+"""Benchmark aggregator throughput and alignment latency with several demo publishers.
+
+Starts ``BENCH_SOURCES`` copies of ``demo_server.py`` on consecutive ports, merges them for
+``BENCH_DURATION`` seconds and prints merged frames per second and latency percentiles.
+Run from the repo root. When the C3D sample at ``DEMO_C3D_PATH`` is not available, the
+sources are synthetic arm swings published from threads at the demo server's rate.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import zmq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aggregator import aggregate, connect_sources  # noqa: E402
+from demo_server import C3D_PATH, FPS, FRAME_STEP  # noqa: E402
+from utils.fanin import FrameAligner  # noqa: E402
+from utils.labels import LABELS  # noqa: E402
+from utils.tiers import TierPublisher  # noqa: E402
+
+SOURCES = int(os.environ.get("BENCH_SOURCES", "3"))
+DURATION = float(os.environ.get("BENCH_DURATION", "10"))
+BASE_PORT = int(os.environ.get("BENCH_BASE_PORT", "5600"))
+
+
+def synthetic_source(context: zmq.Context, bind: str, stop: threading.Event):
+    """Publish a synthetic swing with the demo server's frame step, rate and timestamps."""
+    publisher = TierPublisher(context, bind, tiers="full", frame_step=FRAME_STEP)
+    rest = np.random.default_rng(0).uniform(-500, 1500, (len(LABELS), 3))
+    rate = FPS * FRAME_STEP
+
+    frame = 0
+    while not stop.is_set():
+        swing = 100 * np.sin(2 * np.pi * frame / (2 * rate))
+        publisher.publish(frame, rest + [swing, 0.0, 0.0], frame / rate)
+        frame += FRAME_STEP
+        time.sleep(1 / FPS)
+    publisher.close()
+
+
+def start_sources(context: zmq.Context):
+    """Start the replay servers, or synthetic sources when the C3D sample is missing."""
+    binds = [f"tcp://*:{BASE_PORT + i}" for i in range(SOURCES)]
+
+    if not os.path.exists(C3D_PATH):
+        print(f"{C3D_PATH} not found, benchmarking synthetic sources")
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=synthetic_source, args=(context, bind, stop))
+            for bind in binds
+        ]
+        for thread in threads:
+            thread.start()
+
+        def shutdown():
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        return shutdown
+
+    servers = [
+        subprocess.Popen(
+            [sys.executable, "demo_server.py"],
+            env=dict(os.environ, PUBLISH_BIND=bind, STREAM_TIERS="full"),
+            stdout=subprocess.DEVNULL,
+        )
+        for bind in binds
+    ]
+
+    def shutdown():
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    return shutdown
+
+
+def main() -> None:
+    context = zmq.Context()
+    stop_sources = start_sources(context)
+
+    sockets = connect_sources(
+        context, [f"tcp://127.0.0.1:{BASE_PORT + i}" for i in range(SOURCES)]
+    )
+    publisher = context.socket(zmq.PUB)
+    publisher.bind("inproc://bench-merged")
+
+    # Replays start at different wall times, so align on time since each stream started.
+    aligner = FrameAligner(SOURCES, mode="relative", buffer_size=256)
+
+    try:
+        start = time.perf_counter()
+        aggregate(sockets, publisher, aligner, duration=DURATION)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_sources()
+
+    metrics = aligner.metrics()
+    print(f"sources:            {SOURCES}")
+    print(f"merged frames:      {metrics['merged']} ({metrics['merged'] / elapsed:.1f}/s)")
+    print(f"unmatched frames:   {metrics['unmatched']}")
+    print(f"buffer overflows:   {metrics['overflows']}")
+    print(f"latency p50/p95/max: {metrics['latency_p50_ms']:.2f} / "
+          f"{metrics['latency_p95_ms']:.2f} / {metrics['latency_max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import asyncio
-import json
 import os
 
 import qtm_rt
 import zmq
 
+from utils import trace
+from utils.tiers import TierPublisher
+
 IP_ADDRESS = os.environ.get("QTM_IP", "127.0.0.1")
 QTM_VERSION = os.environ.get("QTM_RT_VERSION", "1.8")
 STREAM_FREQUENCY = int(os.environ.get("STREAM_FREQUENCY", "40"))
@@ -13,12 +15,13 @@ PUBLISH_BIND = os.environ.get("PUBLISH_BIND", "tcp://*:5555")
 
 def on_packet(packet):
     """Publish each frame from QTM over ZeroMQ."""
-    _, markers = packet.get_3d_markers()
-    points = [[marker.x, marker.y, marker.z] for marker in markers]
-    print(f"Received frame {packet.framenumber} ({len(points)} markers)")
+    with trace.span("server.on_packet", packet.framenumber):
+        _, markers = packet.get_3d_markers()
+        points = [[marker.x, marker.y, marker.z] for marker in markers]
+        print(f"Received frame {packet.framenumber} ({len(points)} markers)")
 
-    marker_json = json.dumps({"frame_number": packet.framenumber, "markers": points})
-    publisher.send_string(marker_json)
+        # QTM timestamps are in microseconds.
+        publisher.publish(packet.framenumber, points, packet.timestamp / 1e6)
 
 
 async def setup():
@@ -49,9 +52,7 @@ async def setup():
 
 if __name__ == "__main__":
     context = zmq.Context()
-    publisher = context.socket(zmq.PUB)
-    publisher.bind(PUBLISH_BIND)
-    print(f"Publishing marker stream on {PUBLISH_BIND}")
+    publisher = TierPublisher(context, PUBLISH_BIND)
 
     try:
         asyncio.ensure_future(setup())
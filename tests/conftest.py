@@ -0,0 +1,228 @@
+"""Headless test harness: synthetic marker trajectories, an in-process fake publisher and a
+stub ``qtm_rt`` connection, so clients and servers run without a GUI or lab hardware.
+
+``test_client.py`` and ``test_qtm_connection.py`` are manual scripts and define no tests.
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+import types
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+import zmq  # noqa: E402
+
+from utils.labels import LABELS  # noqa: E402
+from utils.tiers import encode_json  # noqa: E402
+
+# Geometry of the synthetic subject, in raw QTM coordinates (millimetres).
+SHOULDER_HEIGHT = 1400.0
+SHOULDER_WIDTH = 200.0
+ARM_DROP = 280.0  # Vertical distance from shoulder to the elbow markers at rest.
+RIGHT_OFFSET = 30.0  # Sideways offset of the right elbow markers from the shoulder.
+LEFT_OFFSET = -20.0
+MARKER_SPREAD = 15.0  # Anterior/posterior markers sit this far either side of the group center.
+
+_addresses = itertools.count()
+
+
+def make_trajectory(
+    frames: int = 200,
+    swing_angle: float = 0.0,
+    period: int = 80,
+    frame_step: int = 1,
+    fps: float = 100.0,
+) -> dict:
+    """Build a deterministic arm swing trajectory for every marker in ``LABELS``.
+
+    The arms pendulum around the shoulders in the raw x/z plane with amplitude
+    ``swing_angle`` degrees; with an angle of 0 the subject stands still.
+
+    Returns:
+        dict: ``frame_numbers``, ``timestamps``, ``markers`` ``(frames, markers, 3)`` and the
+            exact calibration values of the resting pose
+    """
+    frame_numbers = np.arange(frames) * frame_step
+    phase = 2 * np.pi * frame_numbers / (period * frame_step)
+    theta = np.radians(swing_angle) * np.sin(phase)
+
+    markers = np.zeros((frames, len(LABELS), 3))
+    groups = {
+        "R": (SHOULDER_WIDTH, RIGHT_OFFSET),
+        "L": (-SHOULDER_WIDTH, LEFT_OFFSET),
+    }
+    for side, (y, offset) in groups.items():
+        shoulder = np.array([0.0, y, SHOULDER_HEIGHT])
+        com = np.stack(
+            (
+                ARM_DROP * np.sin(theta),
+                np.full(frames, y + offset),
+                SHOULDER_HEIGHT - ARM_DROP * np.cos(theta),
+            ),
+            axis=1,
+        )
+        spread = np.array([0.0, 0.0, MARKER_SPREAD])
+        markers[:, LABELS.index(f"{side}AS")] = shoulder + spread
+        markers[:, LABELS.index(f"{side}PS")] = shoulder - spread
+        markers[:, LABELS.index(f"{side}AE")] = com + spread
+        markers[:, LABELS.index(f"{side}PE")] = com - spread
+
+    # Markers not used by the clients (acromion, wrists) get plausible fixed positions.
+    for label in ("RAC", "LAC", "RLW", "RMW", "LLW", "LMW"):
+        markers[:, LABELS.index(label)] = [10.0 * LABELS.index(label), 0.0, 1000.0]
+
+    right_arm_length = float(np.hypot(ARM_DROP, RIGHT_OFFSET))
+    left_arm_length = float(np.hypot(ARM_DROP, LEFT_OFFSET))
+    return {
+        "frame_numbers": frame_numbers,
+        "timestamps": frame_numbers / fps,
+        "markers": markers,
+        "frame_step": frame_step,
+        "calibration": {
+            "left_arm_length": left_arm_length,
+            "right_arm_length": right_arm_length,
+            "arm_length": (left_arm_length + right_arm_length) / 2,
+            "left_offset": LEFT_OFFSET,
+            "right_offset": RIGHT_OFFSET,
+        },
+    }
+
+
+class FakePublisher:
+    """Replays a trajectory over an ``inproc://`` endpoint.
+
+    It uses an XPUB socket so replay only starts once a subscriber is attached, which
+    avoids the PUB/SUB slow-joiner race in tests.
+    """
+
+    def __init__(self, context: zmq.Context):
+        self.address = f"inproc://fake-publisher-{next(_addresses)}"
+        self.socket = context.socket(zmq.XPUB)
+        self.socket.bind(self.address)
+        self._thread = None
+
+    def wait_for_subscriber(self, timeout: float = 2.0):
+        if not self.socket.poll(int(timeout * 1000)):
+            raise TimeoutError("No subscriber connected to the fake publisher")
+        self.socket.recv()
+
+    def replay(self, trajectory: dict, fps: float = None, messages: list = None):
+        """Publish every frame of ``trajectory`` in a background thread.
+
+        Args:
+            trajectory (dict): as returned by ``make_trajectory``.
+            fps (float, optional): replay speed, as fast as possible when None.
+            messages (list, optional): pre-encoded messages to send instead.
+        """
+        if messages is None:
+            messages = [
+                encode_json(
+                    int(frame), points, trajectory["frame_step"], float(timestamp)
+                ).encode()
+                for frame, points, timestamp in zip(
+                    trajectory["frame_numbers"],
+                    trajectory["markers"],
+                    trajectory["timestamps"],
+                )
+            ]
+
+        def run():
+            self.wait_for_subscriber()
+            for message in messages:
+                self.socket.send(message)
+                if fps:
+                    time.sleep(1 / fps)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: float = 5.0):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def close(self):
+        self.join()
+        self.socket.close(linger=0)
+
+
+@pytest.fixture
+def context():
+    return zmq.Context.instance()
+
+
+@pytest.fixture
+def trajectory():
+    return make_trajectory
+
+
+@pytest.fixture
+def fake_publisher(context):
+    publisher = FakePublisher(context)
+    yield publisher
+    publisher.close()
+
+
+@pytest.fixture
+def subscriber(context, fake_publisher):
+    from utils.client import connect_to_publisher
+
+    socket = connect_to_publisher(address=fake_publisher.address, context=context)
+    socket.setsockopt(zmq.RCVTIMEO, 2000)
+    yield socket
+    socket.close(linger=0)
+
+
+class FakeMarker:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class FakePacket:
+    """Just enough of ``qtm_rt.QRTPacket`` for ``server.on_packet``."""
+
+    def __init__(self, framenumber: int, timestamp: int, points: np.ndarray):
+        self.framenumber = framenumber
+        self.timestamp = timestamp
+        self._markers = [FakeMarker(*point) for point in points.tolist()]
+
+    def get_3d_markers(self):
+        return {"marker_count": len(self._markers)}, self._markers
+
+
+class FakeConnection:
+    """Stub ``qtm_rt`` connection streaming a synthetic trajectory synchronously."""
+
+    def __init__(self, trajectory: dict):
+        self.trajectory = trajectory
+        self.stream_args = None
+
+    async def stream_frames(self, components=None, frames=None, on_packet=None):
+        self.stream_args = {"components": components, "frames": frames}
+        for frame, points, timestamp in zip(
+            self.trajectory["frame_numbers"],
+            self.trajectory["markers"],
+            self.trajectory["timestamps"],
+        ):
+            # QTM timestamps are integer microseconds.
+            on_packet(FakePacket(int(frame), int(round(timestamp * 1e6)), points))
+
+
+@pytest.fixture
+def stub_qtm(monkeypatch):
+    """Install a stub ``qtm_rt`` module and return its (future) connection holder."""
+    holder = types.SimpleNamespace(connection=None, trajectory=make_trajectory(frames=20))
+
+    async def connect(host, version=None, **kwargs):
+        holder.connection = FakeConnection(holder.trajectory)
+        return holder.connection
+
+    module = types.ModuleType("qtm_rt")
+    module.connect = connect
+    monkeypatch.setitem(sys.modules, "qtm_rt", module)
+    monkeypatch.delitem(sys.modules, "server", raising=False)
+    return holder
@@ -0,0 +1,71 @@
+import pytest
+
+from utils.fanin import FrameAligner
+
+
+def frame(number, timestamp):
+    return {"frame_number": number, "timestamp": timestamp, "markers": [[number, 0, 0]]}
+
+
+def test_frames_are_matched_within_tolerance():
+    aligner = FrameAligner(2, tolerance=0.005, max_wait=1.0)
+    for i in range(5):
+        aligner.add(0, frame(i, i * 0.01), received=0.0)
+        aligner.add(1, frame(100 + i, i * 0.01 + 0.002), received=0.0)
+
+    merged = aligner.pop_ready(now=0.0)
+
+    # The last primary frame waits until source 1 moves past its window.
+    assert [m["frame_number"] for m in merged] == [0, 1, 2, 3]
+    assert all(m["sources"][1]["valid"] for m in merged)
+    assert [m["sources"][1]["frame_number"] for m in merged] == [100, 101, 102, 103]
+    assert merged[0]["sources"][1]["offset"] == pytest.approx(0.002)
+
+
+def test_missing_source_is_flagged_after_max_wait():
+    aligner = FrameAligner(2, tolerance=0.005, max_wait=0.05)
+    aligner.add(0, frame(0, 0.0), received=1.0)
+
+    assert aligner.pop_ready(now=1.01) == []
+    merged = aligner.pop_ready(now=1.06)
+
+    assert merged[0]["sources"][1] == {"source": 1, "valid": False}
+    assert aligner.metrics()["unmatched"] == [1]
+
+
+def test_relative_mode_aligns_streams_started_at_different_times():
+    aligner = FrameAligner(2, tolerance=0.005, max_wait=1.0, mode="relative")
+    for i in range(3):
+        aligner.add(0, frame(i, 50.0 + i * 0.01), received=0.0)
+        aligner.add(1, frame(i, 7.0 + i * 0.01), received=0.0)
+
+    merged = aligner.pop_ready(now=0.0)
+
+    assert [m["sources"][1]["frame_number"] for m in merged] == [0, 1]
+
+
+def test_buffers_are_bounded():
+    aligner = FrameAligner(2, buffer_size=4)
+    for i in range(10):
+        aligner.add(1, frame(i, i * 0.01), received=0.0)
+
+    assert aligner.metrics()["overflows"] == [0, 6]
+
+
+def test_arrival_clock_ignores_capture_timestamps():
+    aligner = FrameAligner(2, tolerance=0.005, max_wait=1.0, clock="arrival")
+    for i in range(3):
+        aligner.add(0, frame(i, 50.0 + i), received=i * 0.01)
+        aligner.add(1, {"frame_number": i, "markers": []}, received=i * 0.01 + 0.001)
+
+    merged = aligner.pop_ready(now=0.0)
+
+    assert [m["sources"][1]["frame_number"] for m in merged] == [0, 1]
+
+
+def test_missing_timestamp_falls_back_with_a_warning(capsys):
+    aligner = FrameAligner(2)
+    aligner.add(1, {"frame_number": 0, "markers": []}, received=1.0)
+    aligner.add(1, {"frame_number": 1, "markers": []}, received=1.01)
+
+    assert capsys.readouterr().out.count("source 1 sends no timestamp") == 1
@@ -0,0 +1,188 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.pipeline import Pipeline, build_pipeline, read_messages, run_pipeline
+from utils.tiers import encode_json
+
+CALIBRATION_CONFIG = [
+    {"stage": "decode"},
+    {"stage": "sequence"},
+    {"stage": "label_map"},
+    {"stage": "filter"},
+    {"stage": "kinematics"},
+    {"stage": "analytics"},
+]
+
+
+def encode(trajectory):
+    return [
+        encode_json(int(frame), points, trajectory["frame_step"]).encode()
+        for frame, points in zip(trajectory["frame_numbers"], trajectory["markers"])
+    ]
+
+
+def test_calibration_matches_resting_pose(trajectory):
+    rest = trajectory(frames=10)
+    pipeline = build_pipeline(CALIBRATION_CONFIG)
+
+    batch = pipeline.submit({"messages": encode(rest)})
+
+    assert list(batch["frame_numbers"]) == list(rest["frame_numbers"])
+    for key, value in rest["calibration"].items():
+        assert batch["calibration"][key] == pytest.approx(value)
+
+
+def test_kinematics_rotates_into_plot_frame(trajectory):
+    swing = trajectory(frames=40, swing_angle=45)
+    batch = build_pipeline().submit({"messages": encode(swing)})
+
+    relative = batch["right_com_xy"] - batch["right_shoulder_xy"]
+    # Raw x (the swing direction) becomes -y on the plot.
+    peak = np.argmax(np.abs(relative[:, 1]))
+    assert abs(relative[peak, 1]) == pytest.approx(280 * np.sin(np.radians(45)), rel=1e-3)
+    np.testing.assert_allclose(relative[:, 0], 30.0)
+
+
+def test_filter_drops_frames_with_missing_markers(trajectory):
+    rest = trajectory(frames=5)
+    rest["markers"][2, 12] = np.nan  # LAE
+
+    batch = build_pipeline().submit({"messages": encode(rest)})
+
+    assert list(batch["frame_numbers"]) == [0, 1, 3, 4]
+
+
+def test_threaded_stages_deliver_every_batch(trajectory):
+    swing = trajectory(frames=50, swing_angle=30)
+    received = []
+    threads = set()
+
+    def collect(batch):
+        received.append(batch)
+        threads.add(threading.current_thread())
+
+    config = [
+        {"stage": "decode"},
+        {"stage": "label_map"},
+        {"stage": "kinematics", "threaded": True},
+        {"stage": "analytics", "threaded": True},
+    ]
+    pipeline = build_pipeline(config, collect=collect)
+
+    pipeline.start()
+    for message in encode(swing):
+        assert pipeline.submit({"messages": [message]}) is None
+    pipeline.stop()
+
+    assert [int(batch["frame_numbers"][-1]) for batch in received] == list(range(50))
+    assert pipeline.timings()["collect"]["calls"] == 50
+    # Sinks may draw, so they must run on the submitting thread.
+    assert threads == {threading.main_thread()}
+
+
+def test_threaded_stage_errors_reach_the_caller():
+    received = []
+
+    def fail_on_three(batch):
+        if batch["value"] == 3:
+            raise RuntimeError("bad batch")
+        return batch
+
+    pipeline = Pipeline(
+        [("fail", fail_on_three, True)],
+        [("collect", lambda batch: received.append(batch["value"]))],
+        queue_size=2,
+    )
+
+    submitted = []
+    pipeline.start()
+    with pytest.raises(RuntimeError, match="bad batch"):
+        try:
+            for value in range(20):
+                submitted.append(value)
+                pipeline.submit({"value": value})
+        finally:
+            pipeline.stop()
+
+    # Every submitted batch but the failing one reached the sink, and the worker stopped.
+    assert received == [value for value in submitted if value != 3]
+    assert pipeline.threaded and not pipeline._threads
+
+
+def test_end_to_end_replay_within_budget(trajectory, fake_publisher, subscriber):
+    frames = 500
+    swing = trajectory(frames=frames, swing_angle=60)
+    received = []
+
+    def collect(batch):
+        received.extend(batch["frame_numbers"])
+        if len(received) >= frames:
+            raise KeyboardInterrupt
+
+    pipeline = build_pipeline(logger=None, collect=collect)
+    fake_publisher.replay(swing)
+
+    start = time.perf_counter()
+    with pytest.raises(KeyboardInterrupt):
+        run_pipeline(pipeline, subscriber, batch_size=16)
+    elapsed = time.perf_counter() - start
+
+    assert received == list(range(frames))
+    # The live stream runs at 40-100 Hz; the client must keep up with a wide margin.
+    assert frames / elapsed > 1000
+    timings = pipeline.timings()
+    assert sum(timing["total_ms"] for timing in timings.values()) / frames < 1.0
+
+
+def test_read_messages_batches_queued_messages(trajectory, fake_publisher, subscriber):
+    fake_publisher.replay(trajectory(frames=8))
+    fake_publisher.join()
+    time.sleep(0.05)
+
+    assert len(read_messages(subscriber, batch_size=5)) == 5
+    assert len(read_messages(subscriber, batch_size=5)) == 3
+
+
+def test_calibration_uses_pipeline_config(tmp_path, monkeypatch):
+    import calibrate
+    import utils.pipeline
+
+    path = tmp_path / "pipeline.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"stage": "decode"},
+                {"stage": "label_map"},
+                {"stage": "kinematics", "threaded": True},
+            ]
+        )
+    )
+    monkeypatch.setattr(utils.pipeline, "PIPELINE_CONFIG", str(path))
+
+    config = calibrate.calibration_config()
+
+    assert [entry["stage"] for entry in config] == [
+        "decode",
+        "sequence",
+        "label_map",
+        "kinematics",
+        "analytics",
+    ]
+    assert config[1]["params"]["tracker"] is calibrate.tracker
+    assert config[3]["threaded"]
+
+
+def test_calibration_rejects_config_without_kinematics(tmp_path, monkeypatch):
+    import calibrate
+    import utils.pipeline
+
+    path = tmp_path / "pipeline.json"
+    path.write_text(json.dumps([{"stage": "decode"}, {"stage": "label_map"}]))
+    monkeypatch.setattr(utils.pipeline, "PIPELINE_CONFIG", str(path))
+
+    with pytest.raises(ValueError, match="'analytics' needs 'kinematics'"):
+        build_pipeline(calibrate.calibration_config())
@@ -0,0 +1,177 @@
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import plot
+from utils.blit import BlitManager
+from utils.feedback import FeedbackEngine
+
+
+@pytest.fixture
+def feedback():
+    protocol = [{"angle": 90, "duration": 10}, {"angle": 30}]
+    return FeedbackEngine(
+        protocol,
+        arm_length=200.0,
+        right_offset=30.0,
+        left_offset=-20.0,
+        separation=plot.SEPARATE_CONSTANT,
+        trail_length=4,
+        hit_radius=10.0,
+    )
+
+
+def test_targets_are_precomputed_per_step(feedback):
+    # Right forward / left backward targets of each step.
+    np.testing.assert_allclose(feedback.targets[0, 0, 0], [130.0, 200.0])
+    np.testing.assert_allclose(feedback.targets[1, 1, 1], [-120.0, -100.0])
+
+
+def test_com_position_is_relative_to_shoulder(feedback):
+    shoulder = np.array([[0.0, 0.0], [10.0, 20.0]])
+    com = np.array([[30.0, 200.0], [40.0, -50.0]])
+
+    np.testing.assert_allclose(
+        feedback.com_positions(shoulder, com), [[130.0, 200.0], [-70.0, -70.0]]
+    )
+
+
+def test_hits_are_scored_once_per_entry(feedback):
+    on_target = np.array([[130.0, 195.0], [-120.0, 0.0]])
+    away = np.array([[130.0, 0.0], [-120.0, 0.0]])
+
+    assert feedback.update(on_target, elapsed=0.0) == (False, True)
+    assert feedback.update(on_target, elapsed=1.0) == (False, False)
+    feedback.update(away, elapsed=2.0)
+    feedback.update(on_target, elapsed=3.0)
+
+    assert feedback.hits.tolist() == [[2, 0], [0, 0]]
+    np.testing.assert_allclose(feedback.error(), [5.0, 200.0])
+
+
+def test_swings_turning_short_of_the_target_are_misses(feedback):
+    # The right arm swings forward to 150 (short of 200), back to -200 (on target), then
+    # forward to 200 (on target); the left arm stands still.
+    swing = [0, 75, 150, 75, 0, -100, -200, -100, 0, 100, 200, 100]
+    scored = []
+    for y in swing:
+        com = np.array([[130.0, float(y)], [-120.0, 0.0]])
+        scored.append(feedback.update(com, elapsed=0.0)[1])
+
+    assert feedback.misses.tolist() == [[1, 0], [0, 0]]
+    assert feedback.hits.tolist() == [[1, 1], [0, 0]]
+    # Scored on the miss (turn detected at 75) and on both hits.
+    assert [i for i, changed in enumerate(scored) if changed] == [3, 6, 10]
+
+
+def test_protocol_steps_advance_with_time(feedback):
+    com = np.zeros((2, 2))
+
+    assert feedback.update(com, elapsed=9.9) == (False, False)
+    assert feedback.update(com, elapsed=10.0)[0]
+    assert feedback.angle == 30
+    assert feedback.update(com, elapsed=1000.0)[0] is False
+
+
+def test_trail_is_a_fixed_size_ring(feedback):
+    for i in range(6):
+        feedback.update(np.full((2, 2), float(i)), elapsed=0.0)
+
+    np.testing.assert_allclose(feedback.trail_xy(0)[:, 0], [2.0, 3.0, 4.0, 5.0])
+
+
+def test_feedback_update_within_budget(feedback):
+    com = np.random.default_rng(0).normal(size=(1000, 2, 2)) * 100
+
+    start = time.perf_counter()
+    for i, frame in enumerate(com):
+        feedback.update(frame, elapsed=i * 0.025)
+        feedback.trail_xy(0)
+        feedback.trail_xy(1)
+    per_frame = (time.perf_counter() - start) / len(com)
+
+    assert per_frame < 0.0005
+
+
+def blit_per_frame(fig, bm, frame, frames=100, repeats=3) -> float:
+    """Best per-frame time of ``frame(i)`` followed by a blit, over a few runs."""
+    fig.canvas.draw()
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(frames):
+            frame(i)
+            bm.update()
+        best = min(best, (time.perf_counter() - start) / frames)
+    plt.close(fig)
+    return best
+
+
+def test_blit_update_within_budget_of_baseline_plot(feedback):
+    # The artists plot.py animated before feedback: the packet number and both arms.
+    fig, ax = plt.subplots(figsize=(8, 8))
+    ax.set_xlim(-250, 250)
+    ax.set_ylim(-250, 250)
+    packet = ax.annotate(
+        "0",
+        (0, 1),
+        xycoords="axes fraction",
+        xytext=(10, -10),
+        textcoords="offset points",
+        ha="left",
+        va="top",
+        animated=True,
+    )
+    (left_com,) = ax.plot(0, 0, "bo", markersize=20, animated=True)
+    (right_com,) = ax.plot(0, 0, "ro", markersize=20, animated=True)
+
+    def baseline_frame(i):
+        packet.set_text(f"packet: {i}")
+        left_com.set_data([-100.0], [i % 200 - 100.0])
+        right_com.set_data([100.0], [i % 200 - 100.0])
+
+    baseline = blit_per_frame(
+        fig, BlitManager(fig.canvas, [packet, left_com, right_com]), baseline_frame
+    )
+
+    # The artists plot.py builds now; the error text changes on every frame (worst case).
+    fig, artists = plot.create_plot(feedback)
+
+    def feedback_frame(i):
+        com = np.array([[130.0, i % 200 - 100.0], [-120.0, i % 200 - 100.0]])
+        feedback.update(com, elapsed=0.0)
+        for arm in range(2):
+            trail = feedback.trail_xy(arm)
+            artists["coms"][arm].set_data([com[arm, 0]], [com[arm, 1]])
+            artists["trails"][arm].set_data(trail[:, 0], trail[:, 1])
+        artists["packet_number"].set_text(f"packet: {i}")
+        artists["error"].set_text(f"error R: {i}  L: {i}")
+
+    per_frame = blit_per_frame(
+        fig, BlitManager(fig.canvas, artists["animated"]), feedback_frame
+    )
+
+    # The default 40 Hz stream leaves 25 ms per frame for the whole client.
+    assert per_frame < 0.01
+    assert per_frame < 2.5 * baseline
+
+
+def test_unchanged_text_is_restored_not_redrawn():
+    fig, ax = plt.subplots()
+    text = ax.annotate("score", (0, 1), xycoords="axes fraction", animated=True)
+    (com,) = ax.plot(0, 0, "ro", animated=True)
+    bm = BlitManager(fig.canvas, [text, com])
+    fig.canvas.draw()
+    bm.update()
+    drawn = np.asarray(fig.canvas.buffer_rgba()).copy()
+
+    calls = []
+    original = fig.draw_artist
+    fig.draw_artist = lambda artist: calls.append(artist) or original(artist)
+    bm.update()
+
+    assert calls == [com]
+    np.testing.assert_array_equal(np.asarray(fig.canvas.buffer_rgba()), drawn)
+    plt.close(fig)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from utils.client import SequenceTracker
+from utils.pipeline import sequence_stage
+
+
+def feed(tracker, frames, stride=None):
+    return [tracker.update(frame, stride) for frame in frames]
+
+
+def test_contiguous_stream_is_complete():
+    tracker = SequenceTracker(stride=5)
+
+    assert feed(tracker, range(0, 100, 5)) == [0] * 20
+    assert tracker.complete
+    assert tracker.metrics()["loss_ratio"] == 0.0
+
+
+def test_gaps_are_measured_against_stride():
+    tracker = SequenceTracker(stride=5)
+
+    assert feed(tracker, [0, 5, 20, 25]) == [0, 0, 2, 0]
+    metrics = tracker.metrics()
+    assert metrics["gaps"] == 1
+    assert metrics["missing"] == 2
+    assert metrics["loss_ratio"] == pytest.approx(2 / 6)
+
+
+def test_stride_is_inferred_when_not_reported():
+    tracker = SequenceTracker()
+
+    results = feed(tracker, [0, 3, 6, 12, 15, 18, 21, 24, 27, 30])
+
+    assert tracker.stride == 3
+    assert tracker.metrics()["missing"] == 1
+    assert results[-1] == 0
+
+
+def test_duplicates_and_late_frames_are_dropped():
+    tracker = SequenceTracker(stride=1)
+
+    assert feed(tracker, [1, 2, 4, 2, 3, 5]) == [0, 0, 1, None, None, 0]
+    metrics = tracker.metrics()
+    assert metrics["duplicates"] == 1
+    assert metrics["reordered"] == 1
+    # Frame 3 turned up late, so nothing is missing any more.
+    assert metrics["missing"] == 0
+
+
+def test_backward_jump_is_a_restart():
+    tracker = SequenceTracker()
+
+    # A replay starting over must not be dropped as duplicates.
+    results = feed(tracker, [1, 2, 3, 4, 5, 1, 2, 3, 4, 5, 6])
+
+    assert results == [0] * 11
+    metrics = tracker.metrics()
+    assert metrics["restarts"] == 1
+    assert metrics["duplicates"] == 0
+    assert metrics["reordered"] == 0
+    assert metrics["received"] == 11
+
+
+def test_interpolation_fills_short_gaps_only():
+    tracker = SequenceTracker(stride=1, max_interpolation_gap=2)
+    previous = np.zeros((2, 3))
+    current = np.full((2, 3), 3.0)
+
+    filled = tracker.interpolate(previous, current, 2)
+    np.testing.assert_allclose(filled[:, 0, 0], [1.0, 2.0])
+    assert tracker.interpolate(previous, current, 3) is None
+
+
+def test_sequence_stage_inserts_interpolated_frames():
+    stage = sequence_stage(SequenceTracker(stride=2), interpolate=True)
+    markers = np.arange(4, dtype=float).reshape(4, 1, 1) * np.ones((4, 1, 3))
+
+    batch = stage({"frame_numbers": np.array([0, 2, 6, 6]), "markers": markers})
+
+    assert list(batch["frame_numbers"]) == [0, 2, 4, 6]
+    assert list(batch["interpolated"]) == [False, False, True, False]
+    np.testing.assert_allclose(batch["markers"][2], 1.5)
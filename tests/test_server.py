@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.frames = []
+
+    def publish(self, frame_number, markers, timestamp=None):
+        self.frames.append((frame_number, markers, timestamp))
+
+
+def test_server_publishes_every_qtm_frame(stub_qtm):
+    import server
+
+    server.publisher = RecordingPublisher()
+    connection = asyncio.run(server.setup())
+
+    assert connection is stub_qtm.connection
+    assert connection.stream_args == {
+        "components": ["3d"],
+        "frames": f"frequency:{server.STREAM_FREQUENCY}",
+    }
+
+    trajectory = stub_qtm.trajectory
+    frames = server.publisher.frames
+    assert [frame for frame, _, _ in frames] == list(trajectory["frame_numbers"])
+    assert frames[3][1] == trajectory["markers"][3].tolist()
+    assert frames[3][2] == pytest.approx(trajectory["timestamps"][3])
@@ -0,0 +1,143 @@
+import json
+
+import numpy as np
+import pytest
+import zmq
+
+import utils.tiers
+from utils.tiers import CompactDecoder, CompactEncoder, TierPublisher, encode_json
+
+
+def test_compact_round_trip_within_quantization(trajectory):
+    swing = trajectory(frames=100, swing_angle=60)
+    encoder = CompactEncoder(scale=0.1, codec="zlib", keyframe_interval=10)
+    decoder = CompactDecoder()
+
+    for frame, points in zip(swing["frame_numbers"], swing["markers"]):
+        rt_data = decoder.decode(encoder.encode(int(frame), points, 1, frame / 100))
+        assert rt_data["frame_number"] == frame
+        np.testing.assert_allclose(rt_data["markers"], points, atol=0.05 + 1e-9)
+
+
+def test_compact_is_smaller_than_json(trajectory):
+    swing = trajectory(frames=100, swing_angle=60)
+    encoder = CompactEncoder(codec="zlib")
+
+    compact = sum(
+        len(encoder.encode(int(frame), points))
+        for frame, points in zip(swing["frame_numbers"], swing["markers"])
+    )
+    full = sum(
+        len(encode_json(int(frame), points))
+        for frame, points in zip(swing["frame_numbers"], swing["markers"])
+    )
+    assert compact < full / 4
+
+
+def test_compact_keeps_missing_markers():
+    encoder = CompactEncoder(codec="none")
+    decoder = CompactDecoder()
+    points = np.array([[1.0, 2.0, 3.0], [np.nan, np.nan, np.nan]])
+
+    decoder.decode(encoder.encode(0, points))
+    rt_data = decoder.decode(encoder.encode(1, points + 1))
+
+    np.testing.assert_allclose(rt_data["markers"][0], [2.0, 3.0, 4.0])
+    assert np.isnan(rt_data["markers"][1]).all()
+
+
+def test_compact_drops_out_of_range_markers():
+    encoder = CompactEncoder(scale=0.1, codec="none")
+    decoder = CompactDecoder()
+    points = np.array([[1.0, 2.0, 3.0], [4000.0, 0.0, 0.0]])
+
+    rt_data = decoder.decode(encoder.encode(0, points))
+
+    # 4 m does not fit int16 at 0.1 mm; it must not be published clipped to 3.27 m.
+    np.testing.assert_allclose(rt_data["markers"][0], [1.0, 2.0, 3.0])
+    assert np.isnan(rt_data["markers"][1]).all()
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_compact_decoder_rejects_corrupt_messages(codec):
+    message = CompactEncoder(codec=codec).encode(0, np.zeros((4, 3)))
+    decoder = CompactDecoder()
+
+    header = message[: utils.tiers.HEADER.size]
+
+    for corrupt in (message[:10], message[:-3], header + b"garbage"):
+        with pytest.raises(ValueError):
+            decoder.decode(corrupt)
+
+
+def test_compact_tier_publishes_empty_frames(context, monkeypatch):
+    monkeypatch.setattr(utils.tiers, "COMPACT_BIND", "inproc://compact-empty")
+    publisher = TierPublisher(context, "inproc://full-empty", tiers="full,compact")
+    subscriber = context.socket(zmq.SUB)
+    subscriber.connect("inproc://compact-empty")
+    subscriber.setsockopt_string(zmq.SUBSCRIBE, "")
+    subscriber.setsockopt(zmq.RCVTIMEO, 2000)
+
+    try:
+        # SUB connections are asynchronous; publish until the first frame arrives.
+        for frame in range(100):
+            publisher.publish(frame, [], 0.0)
+            if subscriber.poll(20):
+                break
+        rt_data = CompactDecoder().decode(subscriber.recv())
+    finally:
+        subscriber.close(linger=0)
+        publisher.close()
+
+    assert rt_data["markers"].shape == (0, 3)
+
+
+def test_compact_decoders_do_not_outlive_their_stream(context):
+    import gc
+
+    from utils import client
+    from utils.pipeline import decode_stage
+
+    message = CompactEncoder().encode(0, np.zeros((2, 3)))
+    before = len(client._compact_decoders)
+
+    for _ in range(3):
+        batch = decode_stage(tier="compact")({"messages": [message]})
+        assert list(batch["frame_numbers"]) == [0]
+    assert len(client._compact_decoders) == before
+
+    socket = context.socket(zmq.SUB)
+    client.decode_message(message, socket, "compact")
+    assert len(client._compact_decoders) == before + 1
+    socket.close()
+    del socket
+    gc.collect()
+    assert len(client._compact_decoders) == before
+
+
+def test_compact_decoder_resyncs_after_loss(trajectory):
+    swing = trajectory(frames=12, swing_angle=30)
+    encoder = CompactEncoder(keyframe_interval=5)
+    decoder = CompactDecoder()
+    messages = [
+        encoder.encode(int(frame), points)
+        for frame, points in zip(swing["frame_numbers"], swing["markers"])
+    ]
+
+    decoded = [decoder.decode(message) for i, message in enumerate(messages) if i != 2]
+
+    # Frames 3-5 are deltas on top of the lost frame 2; frame 6 is the next keyframe.
+    assert decoded[1]["frame_number"] == 1
+    assert decoded[2:5] == [None, None, None]
+    assert decoded[5]["frame_number"] == 6
+
+
+def test_json_tier_carries_stream_metadata():
+    message = json.loads(encode_json(10, np.zeros((2, 5)), frame_step=5, timestamp=0.1))
+
+    assert message == {
+        "frame_number": 10,
+        "markers": [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]],
+        "frame_step": 5,
+        "timestamp": pytest.approx(0.1),
+    }
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import pytest
+
+from utils import trace
+
+
+@pytest.fixture
+def tracing(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace, "ENABLED", True)
+    monkeypatch.setattr(trace, "TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(trace, "_events", [])
+    monkeypatch.setattr(trace, "_file", None)
+    monkeypatch.setattr(trace, "current_frame", None)
+    return tmp_path
+
+
+def test_disabled_tracing_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(trace, "ENABLED", False)
+
+    def work():
+        return 42
+
+    assert trace.traced("work")(work) is work
+    with trace.span("block") as span:
+        span.frame = 3
+    assert trace.span("other") is span
+
+
+def test_spans_are_written_as_chrome_trace(tracing):
+    @trace.traced("decorated")
+    def work():
+        time.sleep(0.001)
+
+    with trace.span("outer", frame=7):
+        work()
+    trace.set_frame(8)
+    with trace.span("late") as span:
+        span.frame = 9
+    trace.record("measured", time.perf_counter(), 0.002)
+    trace.close()
+
+    (path,) = tracing.iterdir()
+    events = [event for event in json.loads(path.read_text()) if event]
+    frames = {event["name"]: event["args"]["frame"] for event in events}
+
+    assert frames == {"decorated": None, "outer": 7, "late": 9, "measured": 8}
+    decorated = next(event for event in events if event["name"] == "decorated")
+    assert decorated["ph"] == "X" and decorated["dur"] >= 1000
+    assert work.__qualname__.endswith("work") and work.__wrapped__ is not work
+
+
+def test_concurrent_records_are_not_lost(tracing, monkeypatch):
+    monkeypatch.setattr(trace, "TRACE_BUFFER", 7)
+
+    def work():
+        for i in range(500):
+            trace.record("worker", time.perf_counter(), 0.0, frame=i)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    trace.close()
+
+    (path,) = tracing.iterdir()
+    events = [event for event in json.loads(path.read_text()) if event]
+    assert len(events) == 2000
+
+
+def test_traces_from_several_processes_merge(tracing, tmp_path):
+    trace.record("a", 1.0, 0.001, frame=1)
+    trace.flush()  # File left unterminated, as if the process was killed.
+    other = tmp_path / "other.json"
+    other.write_text(json.dumps([{"name": "b", "ph": "X", "ts": 0, "dur": 1}, {}]))
+
+    merged = tmp_path / "merged.json"
+    trace.merge(str(merged), [trace.trace_path(), str(other)])
+
+    names = [event["name"] for event in json.loads(merged.read_text())["traceEvents"]]
+    assert names == ["a", "b"]
+    trace.close()
+
+
+def test_disabled_span_overhead_is_negligible(monkeypatch):
+    monkeypatch.setattr(trace, "ENABLED", False)
+    calls = 100_000
+
+    start = time.perf_counter()
+    for i in range(calls):
+        with trace.span("hot", i):
+            pass
+    per_call = (time.perf_counter() - start) / calls
+
+    assert per_call < 2e-6
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from utils import trials
+
+
+@pytest.fixture
+def points(trajectory):
+    swing = trajectory(frames=320, swing_angle=40, period=80)
+    points = np.zeros(swing["markers"].shape[:2] + (5,))
+    points[:, :, :3] = swing["markers"]
+    # Marker 3 (RPS) drops out for frames 100-109, as the c3d reader reports it.
+    points[100:110, 3, :3] = 0.0
+    points[100:110, 3, 3] = -1.0
+    return points
+
+
+def test_index_finds_swing_peaks_and_cycles(points):
+    arrays = trials.build_index(points, first_frame=1, rate=100.0)
+
+    assert list(arrays["forward_peaks"]) == [60, 140, 220, 300]
+    assert list(arrays["backward_peaks"]) == [20, 100, 180, 260]
+    assert arrays["cycles"].tolist() == [[60, 140], [140, 220], [220, 300]]
+
+
+def test_index_records_marker_gaps(points):
+    arrays = trials.build_index(points, first_frame=1, rate=100.0)
+
+    assert arrays["gaps"].tolist() == [[3, 100, 110]]
+    assert not arrays["valid"][100:110, 3].any()
+    assert arrays["valid"][:, [0, 1, 2, 4]].all()
+
+
+def test_seek_by_frame_time_and_cycle(points):
+    trial = trials.TrialIndex(trials.build_index(points, first_frame=1, rate=100.0))
+
+    assert trial.frame_index(51) == 50
+    assert trial.time_index(1.5) == 150
+    assert trial.cycle_range(-1) == (220, 300)
+    assert trial.marker_gaps(3).tolist() == [[100, 110]]
+
+    frame_numbers, positions, valid = trial.frames(*trial.cycle_range(0))
+    assert frame_numbers[0] == 61 and len(frame_numbers) == 80
+    assert np.shares_memory(positions, trial.positions)
+
+
+def test_seek_by_cycle_without_cycles_replays_the_trial(trajectory, monkeypatch, capsys):
+    import demo_server
+
+    rest = trajectory(frames=50)
+    points = np.zeros(rest["markers"].shape[:2] + (5,))
+    points[:, :, :3] = rest["markers"]
+    trial = trials.TrialIndex(trials.build_index(points, first_frame=1, rate=100.0))
+    monkeypatch.setattr(demo_server, "START_CYCLE", "2")
+
+    assert trial.cycles.shape == (0, 2)
+    assert demo_server.playback_range(trial) == (0, 50)
+    assert "no swing cycles" in capsys.readouterr().out
+
+
+def test_index_is_cached_next_to_the_trial(points, tmp_path, monkeypatch):
+    c3d_path = tmp_path / "trial.c3d"
+    c3d_path.write_bytes(b"")
+    reads = []
+
+    def read_c3d(path):
+        reads.append(path)
+        return points, 1, 100.0
+
+    monkeypatch.setattr(trials, "read_c3d", read_c3d)
+
+    first = trials.load_trial(str(c3d_path))
+    second = trials.load_trial(str(c3d_path))
+
+    assert (tmp_path / "trial.index.npz").exists()
+    assert len(reads) == 1
+    np.testing.assert_array_equal(first.cycles, second.cycles)
+    np.testing.assert_array_equal(first.positions, second.positions)
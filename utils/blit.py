@@ -1,8 +1,15 @@
 """Code taken from matplotlib examples. A simple manager for updating the screen with animated artists.
 
 https://matplotlib.org/stable/users/explain/animations/blitting.html#class-based-example
+
+Text is the most expensive artist to draw, so animated text is cached as a rendered region
+and only redrawn when its string changes.
 """
 
+from matplotlib.text import Text
+
+from utils.trace import traced
+
 
 class BlitManager:
     def __init__(self, canvas, animated_artists=()):
@@ -20,6 +27,8 @@ class BlitManager:
         self.canvas = canvas
         self._bg = None
         self._artists = []
+        # Text artist -> (string, rendered region) as last drawn on top of the background.
+        self._text_cache = {}
 
         for a in animated_artists:
             self.add_artist(a)
@@ -34,6 +43,7 @@ class BlitManager:
             if event.canvas != cv:
                 raise RuntimeError
         self._bg = cv.copy_from_bbox(cv.figure.bbox)
+        self._text_cache.clear()
         self._draw_animated()
 
     def add_artist(self, art):
@@ -54,12 +64,41 @@ class BlitManager:
         art.set_animated(True)
         self._artists.append(art)
 
+    def refresh_background(self):
+        """Redraw the whole figure, e.g. after changing a non-animated artist.
+
+        The new background is captured by ``on_draw``.
+        """
+        self.canvas.draw()
+
     def _draw_animated(self):
-        """Draw all of the animated artists."""
-        fig = self.canvas.figure
+        """Draw all of the animated artists.
+
+        Text comes first, straight on top of the background, so its cached region never
+        holds other artists. Unchanged text is restored from the cache instead of drawn.
+        """
+        cv = self.canvas
+        fig = cv.figure
         for a in self._artists:
+            if not isinstance(a, Text):
+                continue
+            text = a.get_text()
+            cached = self._text_cache.get(a)
+            if cached is not None and cached[0] == text:
+                if cached[1] is not None:
+                    cv.restore_region(cached[1])
+                continue
             fig.draw_artist(a)
+            region = None
+            if text:
+                region = cv.copy_from_bbox(a.get_window_extent().padded(2))
+            self._text_cache[a] = (text, region)
+
+        for a in self._artists:
+            if not isinstance(a, Text):
+                fig.draw_artist(a)
 
+    @traced("BlitManager.update")
     def update(self):
         """Update the screen with animated artists."""
         cv = self.canvas
@@ -3,27 +3,47 @@ import zmq
 import json
 import logging
 import numpy as np
+import weakref
+from collections import deque
 from datetime import datetime
 
+from utils import trace
+from utils.tiers import CompactDecoder
+
 # URL for the publisher socket; override with environment variable when needed.
 PUBLISHER_SOCKET = os.environ.get("PUBLISHER_SOCKET", "tcp://127.0.0.1:5555")
+# Stream tier served at PUBLISHER_SOCKET: "full" / "decimated" (JSON) or "compact" (binary).
+PUBLISHER_TIER = os.environ.get("PUBLISHER_TIER", "full")
+# Longest gap (in missing frames) that SequenceTracker.interpolate will fill.
+MAX_INTERPOLATION_GAP = int(os.environ.get("MAX_INTERPOLATION_GAP", "2"))
+# Backward jumps of more than this many strides are a publisher restart, not late frames.
+RESTART_STRIDES = int(os.environ.get("RESTART_STRIDES", "3"))
+# Frames observed before the stride is inferred when the stream does not report one.
+STRIDE_INFERENCE_FRAMES = 8
 
 
-def connect_to_publisher(logger: logging.Logger = None) -> zmq.Socket:
+def connect_to_publisher(
+    logger: logging.Logger = None,
+    address: str = PUBLISHER_SOCKET,
+    context: zmq.Context = None,
+) -> zmq.Socket:
     """Connect to publisher socket and return subscriber socket
 
     Args:
         logger (logging.Logger, optional): Logger, defaults to None.
+        address (str, optional): publisher endpoint, defaults to PUBLISHER_SOCKET.
+        context (zmq.Context, optional): context to create the socket in; pass a shared
+            context to reach ``inproc://`` publishers. Defaults to a new context.
     Returns:
         zmq.Socket: subscriber socket
     """
     if logger:
         logger.info("Connecting to publisher...")
-    context = zmq.Context()
+    context = context or zmq.Context()
 
     # Set up subscriber
     subscriber = context.socket(zmq.SUB)
-    subscriber.connect(PUBLISHER_SOCKET)
+    subscriber.connect(address)
     subscriber.setsockopt_string(zmq.SUBSCRIBE, "")
 
     return subscriber
@@ -46,9 +66,180 @@ def setup_client_logger() -> logging.Logger:
     return logger
 
 
-def get_qrt_data(logger: logging.Logger, socket: zmq.Socket) -> tuple:
+class SequenceTracker:
+    """Tracks frame numbers of a stream and accounts for gaps, duplicates and reordering.
+
+    Publishers may skip frames on purpose (e.g. ``DEMO_FRAME_STEP``), so gaps are measured
+    against the expected stride. The stride comes from the ``frame_step`` field of each
+    message when present, otherwise it is inferred from the smallest step seen in the
+    first few frames.
+
+    A backward jump larger than ``restart_strides`` strides (e.g. a replay starting over) is
+    treated as a restart of the stream: the frame history is cleared and counting resumes
+    from the new frame.
+    """
+
+    def __init__(
+        self,
+        stride: int = None,
+        max_interpolation_gap: int = MAX_INTERPOLATION_GAP,
+        window: int = 1024,
+        restart_strides: int = RESTART_STRIDES,
+    ):
+        """
+        Args:
+            stride (int, optional): expected frame number step, inferred when None.
+            max_interpolation_gap (int, optional): longest gap filled by ``interpolate``.
+            window (int, optional): how many recent frames are remembered to tell
+                duplicates from late (reordered) frames.
+            restart_strides (int, optional): largest backward jump, in strides, still
+                treated as a late frame rather than a restart.
+        """
+        self.stride = stride
+        self.max_interpolation_gap = max_interpolation_gap
+        self.last_frame = None
+
+        self.received = 0
+        self.gaps = 0
+        self.missing = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.restarts = 0
+        self.restart_strides = restart_strides
+
+        self._seen = set()
+        self._seen_order = deque()
+        self._lost = set()
+        self._lost_order = deque()
+        self._window = window
+        self._pending = []
+
+    def update(self, frame_number: int, stride: int = None) -> int | None:
+        """Record a received frame.
+
+        Args:
+            frame_number (int): frame number of the received message.
+            stride (int, optional): stride reported by the publisher for this message.
+        Returns:
+            int | None: number of frames missing right before this one, or None when the
+                frame is a duplicate or arrived after a newer frame and should be dropped.
+        """
+        if stride:
+            self.stride = stride
+
+        if (
+            self.last_frame is not None
+            and self.last_frame - frame_number
+            > min(self.restart_strides, self._window) * (self.stride or 1)
+        ):
+            self._restart()
+
+        if frame_number in self._seen:
+            self.duplicates += 1
+            return None
+
+        self._remember(self._seen, self._seen_order, frame_number)
+
+        if self.last_frame is not None and frame_number < self.last_frame:
+            self.reordered += 1
+            if frame_number in self._lost:
+                # A frame we counted as lost turned up late.
+                self._lost.discard(frame_number)
+                self.missing -= 1
+            return None
+
+        self.received += 1
+        previous, self.last_frame = self.last_frame, frame_number
+        if previous is None:
+            return 0
+
+        if self.stride is None:
+            self._pending.append((previous, frame_number))
+            if len(self._pending) < STRIDE_INFERENCE_FRAMES:
+                return 0
+
+            self.stride = min(current - last for last, current in self._pending)
+            pending, self._pending = self._pending[:-1], []
+            for last, current in pending:
+                self._account_gap(last, current)
+
+        return self._account_gap(previous, frame_number)
+
+    def interpolate(
+        self, previous: np.ndarray, current: np.ndarray, missing: int
+    ) -> np.ndarray | None:
+        """Linearly interpolate marker positions across a short gap.
+
+        Args:
+            previous (np.ndarray): markers of the frame before the gap.
+            current (np.ndarray): markers of the frame after the gap.
+            missing (int): number of missing frames, as returned by ``update``.
+        Returns:
+            np.ndarray | None: ``(missing, markers, 3)`` positions, or None when the gap is
+                too long or the frames are not comparable.
+        """
+        if not 0 < missing <= self.max_interpolation_gap:
+            return None
+        if previous.shape != current.shape:
+            return None
+
+        weights = np.arange(1, missing + 1) / (missing + 1)
+        weights = weights.reshape((-1,) + (1,) * previous.ndim)
+        return previous + weights * (current - previous)
+
+    def metrics(self) -> dict:
+        """Return stream completeness counters."""
+        expected = self.received + self.missing
+        return {
+            "received": self.received,
+            "gaps": self.gaps,
+            "missing": self.missing,
+            "duplicates": self.duplicates,
+            "reordered": self.reordered,
+            "restarts": self.restarts,
+            "stride": self.stride,
+            "loss_ratio": self.missing / expected if expected else 0.0,
+        }
+
+    @property
+    def complete(self) -> bool:
+        """True when no frames are currently accounted as missing."""
+        return self.missing == 0
+
+    def _restart(self):
+        # Frames lost before the restart stay counted, but can no longer turn up late.
+        self.restarts += 1
+        self.last_frame = None
+        self._seen.clear()
+        self._seen_order.clear()
+        self._lost.clear()
+        self._lost_order.clear()
+
+    def _account_gap(self, previous: int, current: int) -> int:
+        missing = max((current - previous) // self.stride - 1, 0)
+        if missing:
+            self.gaps += 1
+            self.missing += missing
+            if missing <= self._window:
+                for frame in range(previous + self.stride, current, self.stride):
+                    self._remember(self._lost, self._lost_order, frame)
+        return missing
+
+    def _remember(self, frames: set, order: deque, frame_number: int):
+        frames.add(frame_number)
+        order.append(frame_number)
+        if len(order) > self._window:
+            frames.discard(order.popleft())
+
+
+def get_qrt_data(
+    logger: logging.Logger, socket: zmq.Socket, tracker: SequenceTracker = None
+) -> tuple:
     """Get marker data from Motion Capture.
 
+    Args:
+        tracker (SequenceTracker, optional): records the frame sequence; duplicate and
+            out-of-order frames are dropped and reported as (None, [], []).
     Returns:
         tuple: (frame_number | None, marker_data, analog_data)
     """
@@ -64,6 +255,13 @@ def get_qrt_data(logger: logging.Logger, socket: zmq.Socket) -> tuple:
 
     frame_number = rt_data.get("frame_number")
 
+    if tracker and frame_number is not None:
+        missing = tracker.update(frame_number, rt_data.get("frame_step"))
+        if missing is None:
+            return None, marker_data, analog_data
+        if missing and logger:
+            logger.warning(f"{missing} frame(s) missing before frame {frame_number}")
+
     for point in rt_data.get("markers", []):
         marker_data.append(np.array(point))
 
@@ -78,10 +276,14 @@ def read_mocap_data(logger: logging.Logger, socket: zmq.Socket) -> dict | None:
     """
     rt_data = None
     try:
-        message = socket.recv_string()
+        message = socket.recv()
         try:
-            rt_data = json.loads(message)
-        except json.JSONDecodeError as error:
+            with trace.span("client.read_mocap_data") as span:
+                rt_data = decode_message(message, socket)
+                if rt_data:
+                    span.frame = rt_data.get("frame_number")
+                    trace.set_frame(span.frame)
+        except (json.JSONDecodeError, ValueError) as error:
             if logger:
                 logger.error(f"An error occurred while decoding JSON: {error}")
             else:
@@ -96,3 +298,36 @@ def read_mocap_data(logger: logging.Logger, socket: zmq.Socket) -> dict | None:
         return None
 
     return rt_data
+
+
+# Compact tier decoders keep delta state per subscriber socket, for as long as it exists.
+_compact_decoders = weakref.WeakKeyDictionary()
+
+
+def decode_message(
+    message: bytes,
+    socket: zmq.Socket = None,
+    tier: str = PUBLISHER_TIER,
+    decoder: CompactDecoder = None,
+) -> dict | None:
+    """Decode a raw message of the given stream tier.
+
+    Args:
+        message (bytes): raw message.
+        socket (zmq.Socket, optional): socket the message came from; compact tier delta
+            state is kept per socket unless ``decoder`` is given.
+        tier (str, optional): stream tier of the message.
+        decoder (CompactDecoder, optional): decoder owned by the caller.
+    Returns:
+        dict | None: frame data, or None while a compact stream waits for a keyframe
+    """
+    if tier != "compact":
+        return json.loads(message)
+
+    if decoder is None:
+        if socket is None:
+            raise TypeError("Decoding the compact tier needs a socket or a decoder")
+        decoder = _compact_decoders.get(socket)
+        if decoder is None:
+            decoder = _compact_decoders[socket] = CompactDecoder()
+    return decoder.decode(message)
@@ -0,0 +1,189 @@
+"""Time alignment of frames coming from several publishers.
+
+The first source is the primary: one merged frame is produced per primary frame. Every
+other source contributes its frame closest in time, if it is within the tolerance window.
+"""
+
+import os
+from collections import deque
+
+# Largest timestamp difference (seconds) for frames to be considered simultaneous.
+ALIGN_TOLERANCE = float(os.environ.get("ALIGN_TOLERANCE", "0.015"))
+# Longest time (seconds) a primary frame waits for the other sources before being sent.
+ALIGN_MAX_WAIT = float(os.environ.get("ALIGN_MAX_WAIT", "0.1"))
+# Frames buffered per source.
+ALIGN_BUFFER = int(os.environ.get("ALIGN_BUFFER", "64"))
+# "absolute" compares capture timestamps directly (synchronized capture volumes);
+# "relative" measures each source from its first frame (e.g. replay overlaid on live data).
+ALIGN_MODE = os.environ.get("ALIGN_MODE", "absolute")
+# "capture" aligns on the ``timestamp`` sent by the publishers; "arrival" aligns every source
+# on the time its frames were received, for publishers that send no timestamp.
+ALIGN_CLOCK = os.environ.get("ALIGN_CLOCK", "capture")
+
+
+class FrameAligner:
+    """Buffers frames per source and merges them by timestamp."""
+
+    def __init__(
+        self,
+        sources: int,
+        tolerance: float = ALIGN_TOLERANCE,
+        max_wait: float = ALIGN_MAX_WAIT,
+        buffer_size: int = ALIGN_BUFFER,
+        mode: str = ALIGN_MODE,
+        clock: str = ALIGN_CLOCK,
+    ):
+        """
+        Args:
+            sources (int): number of sources; source 0 is the primary.
+            tolerance (float, optional): alignment window in seconds.
+            max_wait (float, optional): how long a primary frame waits for late sources.
+            buffer_size (int, optional): frames kept per source; the oldest are dropped.
+            mode (str, optional): "absolute" or "relative" timestamps.
+            clock (str, optional): "capture" or "arrival" timestamps.
+        """
+        if mode not in ("absolute", "relative"):
+            raise ValueError(f"Unknown alignment mode: {mode}")
+        if clock not in ("capture", "arrival"):
+            raise ValueError(f"Unknown alignment clock: {clock}")
+
+        self.tolerance = tolerance
+        self.max_wait = max_wait
+        self.relative = mode == "relative"
+        self.arrival = clock == "arrival"
+
+        # Entries are (timestamp, received, rt_data).
+        self._buffers = [deque(maxlen=buffer_size) for _ in range(sources)]
+        self._origins = [None] * sources
+        self._latest = [None] * sources
+        self._untimed = [False] * sources
+
+        self.merged = 0
+        self.overflows = [0] * sources
+        self.unmatched = [0] * sources
+        self.latencies = deque(maxlen=4096)
+
+    def add(self, source: int, rt_data: dict, received: float):
+        """Buffer a frame from ``source``.
+
+        Args:
+            source (int): index of the source.
+            rt_data (dict): decoded frame; ``timestamp`` (seconds) is used on the capture
+                clock.
+            received (float): arrival time (``time.monotonic()``), used on the arrival
+                clock and to measure alignment latency.
+        """
+        timestamp = received if self.arrival else rt_data.get("timestamp")
+        if timestamp is None:
+            # Arrival times are not comparable with the capture times of other sources.
+            if not self._untimed[source]:
+                self._untimed[source] = True
+                print(
+                    f"Warning: source {source} sends no timestamp, aligning its frames on "
+                    "arrival time (set ALIGN_CLOCK=arrival to use it for every source)"
+                )
+            timestamp = received
+
+        if self.relative:
+            if self._origins[source] is None:
+                self._origins[source] = timestamp
+            timestamp -= self._origins[source]
+
+        buffer = self._buffers[source]
+        if len(buffer) == buffer.maxlen:
+            self.overflows[source] += 1
+        buffer.append((timestamp, received, rt_data))
+        self._latest[source] = timestamp
+
+    def pop_ready(self, now: float) -> list[dict]:
+        """Return the merged frames that can no longer improve.
+
+        A primary frame is ready once every other source has delivered a frame past the end
+        of its tolerance window, or once it has waited ``max_wait`` seconds.
+
+        Args:
+            now (float): current ``time.monotonic()``.
+        Returns:
+            list[dict]: merged frames, oldest first
+        """
+        merged = []
+        primary = self._buffers[0]
+        while primary:
+            timestamp, received, rt_data = primary[0]
+            window_closed = all(
+                latest is not None and latest > timestamp + self.tolerance
+                for latest in self._latest[1:]
+            )
+            if not window_closed and now - received < self.max_wait:
+                break
+
+            primary.popleft()
+            merged.append(self._merge(timestamp, rt_data))
+            self.latencies.append(now - received)
+        return merged
+
+    def _merge(self, timestamp: float, rt_data: dict) -> dict:
+        sources = [
+            {
+                "source": 0,
+                "valid": True,
+                "frame_number": rt_data.get("frame_number"),
+                "timestamp": timestamp,
+                "markers": rt_data.get("markers", []),
+            }
+        ]
+
+        for source, buffer in enumerate(self._buffers[1:], start=1):
+            # Frames too old to match this or any later primary frame.
+            while buffer and buffer[0][0] < timestamp - self.tolerance:
+                buffer.popleft()
+
+            best = None
+            for entry in buffer:
+                if entry[0] > timestamp + self.tolerance:
+                    break
+                if best is None or abs(entry[0] - timestamp) < abs(best[0] - timestamp):
+                    best = entry
+
+            if best is None:
+                self.unmatched[source] += 1
+                sources.append({"source": source, "valid": False})
+                continue
+
+            sources.append(
+                {
+                    "source": source,
+                    "valid": True,
+                    "frame_number": best[2].get("frame_number"),
+                    "timestamp": best[0],
+                    "offset": best[0] - timestamp,
+                    "markers": best[2].get("markers", []),
+                }
+            )
+
+        self.merged += 1
+        # Primary markers stay at the top level so single-source clients keep working.
+        return {
+            "frame_number": rt_data.get("frame_number"),
+            "timestamp": timestamp,
+            "markers": rt_data.get("markers", []),
+            "sources": sources,
+        }
+
+    def metrics(self) -> dict:
+        """Return merge counters and alignment latency percentiles in milliseconds."""
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000
+
+        return {
+            "merged": self.merged,
+            "unmatched": self.unmatched[1:],
+            "overflows": self.overflows,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": percentile(1.0),
+        }
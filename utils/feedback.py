@@ -0,0 +1,167 @@
+"""Swing feedback for the visualization: protocol targets, trails and hit/miss scoring.
+
+A protocol is a list of steps, each with a target swing angle and a duration. Target
+positions for every step are computed once up front, so per frame the engine only records
+the trail and measures the distance from both arms to their targets in one NumPy step.
+
+A swing that turns around without having entered the target it was heading for counts as a
+miss of that target.
+"""
+
+import json
+import os
+
+import numpy as np
+
+# JSON file with protocol steps, e.g. [{"angle": 120, "duration": 30}, {"angle": 160}].
+PROTOCOL_PATH = os.environ.get("PROTOCOL_PATH")
+# Number of past center of mass positions drawn behind each arm.
+TRAIL_LENGTH = int(os.environ.get("TRAIL_LENGTH", "30"))
+# Distance (plot units, mm) within which a target counts as hit.
+HIT_RADIUS = float(os.environ.get("HIT_RADIUS", "20"))
+
+ARMS = ("right", "left")
+DIRECTIONS = ("forward", "backward")
+
+
+def load_protocol(default_angle: float, path: str = PROTOCOL_PATH) -> list[dict]:
+    """Read the protocol steps, or a single open-ended step at ``default_angle``.
+
+    A step without ``duration`` lasts until the end of the session.
+    """
+    if not path:
+        return [{"angle": default_angle}]
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class FeedbackEngine:
+    """Tracks both arms against the targets of the current protocol step."""
+
+    def __init__(
+        self,
+        protocol: list[dict],
+        arm_length: float,
+        right_offset: float,
+        left_offset: float,
+        separation: float,
+        trail_length: int = TRAIL_LENGTH,
+        hit_radius: float = HIT_RADIUS,
+    ):
+        """
+        Args:
+            protocol (list[dict]): steps with ``angle`` (degrees) and optional ``duration`` (s).
+            arm_length (float): calibrated arm length.
+            right_offset (float): calibrated right center of mass offset.
+            left_offset (float): calibrated left center of mass offset.
+            separation (float): distance of each arm from the center of the screen.
+            trail_length (int, optional): positions kept in each arm's trail.
+            hit_radius (float, optional): distance within which a target is hit; an arm
+                has turned around once it is this far back from its furthest position.
+        """
+        self.angles = np.array([step["angle"] for step in protocol], dtype=float)
+        durations = np.array(
+            [step.get("duration") or np.inf for step in protocol], dtype=float
+        )
+        self.step_ends = np.cumsum(durations)
+        self.hit_radius = hit_radius
+
+        # Arms are drawn apart from the center: right at +separation, left at -separation.
+        self.separation = np.array([separation, -separation])
+        x = self.separation + np.array([right_offset, left_offset])
+        amplitude = np.sin(np.radians(self.angles)) * arm_length
+
+        # targets[step, arm, direction] = (x, y)
+        self.targets = np.empty((len(protocol), 2, 2, 2))
+        self.targets[:, :, :, 0] = x[None, :, None]
+        self.targets[:, :, 0, 1] = amplitude[:, None]
+        self.targets[:, :, 1, 1] = -amplitude[:, None]
+
+        self.step = 0
+        self.trail = np.full((2, trail_length, 2), np.nan)
+        self._trail_index = 0
+
+        self.distance = np.full((2, 2), np.inf)
+        self.hits = np.zeros((2, 2), dtype=int)
+        self.misses = np.zeros((2, 2), dtype=int)
+        self._inside = np.zeros((2, 2), dtype=bool)
+
+        # Current swing of each arm: +1 forward, -1 backward, 0 before the first swing, its
+        # furthest y so far and whether each target was entered since that direction's last swing.
+        self._heading = np.zeros(2)
+        self._extreme = None
+        self._reached = np.zeros((2, 2), dtype=bool)
+
+    def com_positions(self, shoulder: np.ndarray, com: np.ndarray) -> np.ndarray:
+        """Center of mass of both arms relative to the shoulders, on the plot.
+
+        Args:
+            shoulder (np.ndarray): ``(2, 2)`` right/left shoulder positions in the plot frame.
+            com (np.ndarray): ``(2, 2)`` right/left center of mass positions in the plot frame.
+        """
+        relative = com - shoulder
+        relative[:, 0] += self.separation
+        return relative
+
+    def update(self, com: np.ndarray, elapsed: float) -> tuple[bool, bool]:
+        """Record one frame.
+
+        Args:
+            com (np.ndarray): ``(2, 2)`` right/left positions from ``com_positions``.
+            elapsed (float): seconds since the session started.
+        Returns:
+            tuple[bool, bool]: (protocol step changed, a target was newly hit or missed)
+        """
+        step = min(
+            int(np.searchsorted(self.step_ends, elapsed, side="right")),
+            len(self.step_ends) - 1,
+        )
+        step_changed = step != self.step
+        self.step = step
+
+        self.trail[:, self._trail_index] = com
+        self._trail_index = (self._trail_index + 1) % self.trail.shape[1]
+
+        # Distance from each arm to its forward and backward target.
+        self.distance = np.linalg.norm(self.targets[step] - com[:, None, :], axis=2)
+        inside = self.distance < self.hit_radius
+        new_hits = inside & ~self._inside
+        self.hits += new_hits
+        self._inside = inside
+        self._reached |= inside
+
+        return step_changed, bool(new_hits.any()) | self._score_misses(com[:, 1])
+
+    def _score_misses(self, y: np.ndarray) -> bool:
+        if self._extreme is None:
+            self._extreme = y.copy()
+            return False
+
+        moved = y - self._extreme
+        further = moved * self._heading > 0
+        self._extreme[further] = y[further]
+        turned = ~further & (np.abs(moved) > self.hit_radius)
+
+        # A forward swing (+y) aims at target 0, a backward swing at target 1.
+        arms = np.flatnonzero(turned & (self._heading != 0))
+        directions = (self._heading[arms] < 0).astype(int)
+        missed = ~self._reached[arms, directions]
+        self.misses[arms[missed], directions[missed]] += 1
+        self._reached[arms, directions] = False
+
+        self._heading[turned] = np.sign(moved[turned])
+        self._extreme[turned] = y[turned]
+        return bool(missed.any())
+
+    def trail_xy(self, arm: int) -> np.ndarray:
+        """Trail of ``arm`` (0 right, 1 left), oldest first."""
+        return np.roll(self.trail[arm], -self._trail_index, axis=0)
+
+    def error(self) -> np.ndarray:
+        """Distance of each arm to its nearest target."""
+        return self.distance.min(axis=1)
+
+    @property
+    def angle(self) -> float:
+        return self.angles[self.step]
@@ -0,0 +1,625 @@
+"""Configurable processing pipeline shared by the visualization and calibration clients.
+
+A pipeline is an ordered list of stages declared in a config (a list of dicts, or a JSON
+file pointed to by ``PIPELINE_CONFIG``). Each stage takes a batch (a dict of NumPy arrays
+covering one or more frames) and returns the updated batch, or ``None`` to drop it.
+
+Example config::
+
+    [
+        {"stage": "decode"},
+        {"stage": "sequence", "params": {"interpolate": true}},
+        {"stage": "label_map"},
+        {"stage": "filter"},
+        {"stage": "kinematics"},
+        {"stage": "analytics", "threaded": true}
+    ]
+
+Sinks are Python callbacks, so they cannot be declared in the JSON file; pass them as
+keywords to ``build_pipeline`` instead, e.g. ``build_pipeline(draw=draw_frame)``.
+
+Stages marked ``threaded`` get their own worker thread fed by a bounded queue, so a slow
+consumer applies back pressure instead of growing memory without limit. Sinks are handed
+the finished batches back on the thread feeding the pipeline, so they can safely draw.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from utils import trace
+from utils.client import SequenceTracker, decode_message, PUBLISHER_TIER
+from utils.labels import (
+    RIGHT_COM_LABELS,
+    LEFT_COM_LABELS,
+    RIGHT_SHOULDER_LABELS,
+    LEFT_SHOULDER_LABELS,
+)
+from utils.tiers import CompactDecoder
+
+# Number of messages decoded together; 1 keeps the lowest latency for live plots.
+PIPELINE_BATCH_SIZE = int(os.environ.get("PIPELINE_BATCH_SIZE", "1"))
+# Maximum number of batches waiting in front of a threaded stage.
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "8"))
+# Optional JSON file describing the stages; overrides the default config.
+PIPELINE_CONFIG = os.environ.get("PIPELINE_CONFIG")
+
+# Marker groups averaged by the label_map stage.
+DEFAULT_GROUPS = {
+    "right_shoulder": RIGHT_SHOULDER_LABELS,
+    "right_com": RIGHT_COM_LABELS,
+    "left_shoulder": LEFT_SHOULDER_LABELS,
+    "left_com": LEFT_COM_LABELS,
+}
+
+DEFAULT_CONFIG = [
+    {"stage": "decode"},
+    {"stage": "sequence"},
+    {"stage": "label_map"},
+    {"stage": "filter"},
+    {"stage": "kinematics"},
+]
+
+ARMS = ("right", "left")
+
+_STOP = object()
+
+
+class _Failure:
+    """Exception raised by a threaded stage, handed on to be re-raised by ``drain``."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def decode_stage(logger: logging.Logger = None, tier: str = PUBLISHER_TIER):
+    """Build a stage that turns raw messages into a marker batch.
+
+    Frames with fewer markers than the widest frame in the batch are padded with NaN.
+
+    Args:
+        logger (logging.Logger, optional): decoding errors are logged.
+        tier (str, optional): stream tier the messages come from.
+    Returns:
+        callable: stage taking ``{"messages": list[bytes]}``
+    """
+    # Compact tier delta state, owned by the stage.
+    decoder = CompactDecoder() if tier == "compact" else None
+
+    def decode(batch: dict) -> dict | None:
+        frame_numbers = []
+        frames = []
+        for message in batch.pop("messages"):
+            try:
+                rt_data = decode_message(message, tier=tier, decoder=decoder)
+            except ValueError as error:
+                if logger:
+                    logger.error(f"An error occurred while decoding a message: {error}")
+                continue
+
+            if rt_data is None or rt_data.get("frame_number") is None:
+                continue
+            frame_number = rt_data["frame_number"]
+            frame_numbers.append(frame_number)
+            frames.append(rt_data.get("markers", []))
+            if rt_data.get("frame_step"):
+                batch["frame_step"] = rt_data["frame_step"]
+
+        if not frames:
+            return None
+
+        marker_count = max(len(markers) for markers in frames)
+        markers = np.full((len(frames), marker_count, 3), np.nan)
+        for i, points in enumerate(frames):
+            if len(points):
+                markers[i, : len(points)] = np.asarray(points, dtype=float)[:, :3]
+
+        batch["frame_numbers"] = np.asarray(frame_numbers, dtype=np.int64)
+        batch["markers"] = markers
+        return batch
+
+    return decode
+
+
+def sequence_stage(
+    tracker: SequenceTracker = None,
+    interpolate: bool = False,
+    logger: logging.Logger = None,
+):
+    """Build a stage that tracks frame numbers and drops duplicate or late frames.
+
+    Args:
+        tracker (SequenceTracker, optional): tracker to update, a new one when None.
+        interpolate (bool, optional): insert linearly interpolated frames for gaps of up to
+            ``tracker.max_interpolation_gap`` frames. Inserted frames are flagged in the
+            ``interpolated`` array of the batch.
+        logger (logging.Logger, optional): gaps are logged as warnings.
+    Returns:
+        callable: stage keeping frames in increasing order
+    """
+    tracker = tracker or SequenceTracker()
+    previous = [None]
+
+    def sequence(batch: dict) -> dict | None:
+        frame_numbers = []
+        markers = []
+        interpolated = []
+        for frame_number, points in zip(batch["frame_numbers"], batch["markers"]):
+            missing = tracker.update(int(frame_number), batch.get("frame_step"))
+            if missing is None:
+                continue
+
+            if missing and logger:
+                logger.warning(f"{missing} frame(s) missing before frame {frame_number}")
+
+            filled = None
+            if missing and interpolate and previous[0] is not None:
+                filled = tracker.interpolate(previous[0], points, missing)
+            if filled is not None:
+                first = frame_number - missing * tracker.stride
+                frame_numbers.extend(range(first, frame_number, tracker.stride))
+                markers.extend(filled)
+                interpolated.extend([True] * missing)
+
+            frame_numbers.append(frame_number)
+            markers.append(points)
+            interpolated.append(False)
+            previous[0] = points
+
+        if not frame_numbers:
+            return None
+
+        batch["frame_numbers"] = np.asarray(frame_numbers, dtype=np.int64)
+        batch["markers"] = np.stack(markers)
+        batch["interpolated"] = np.asarray(interpolated)
+        return batch
+
+    sequence.tracker = tracker
+    return sequence
+
+
+def label_map_stage(groups: dict = None):
+    """Build a stage that averages labelled markers into named groups.
+
+    Args:
+        groups (dict, optional): group name -> marker indices, defaults to DEFAULT_GROUPS.
+    Returns:
+        callable: stage adding one ``(frames, 3)`` array per group
+    """
+    groups = {name: np.asarray(idx) for name, idx in (groups or DEFAULT_GROUPS).items()}
+    required = max(int(idx.max()) for idx in groups.values()) + 1
+
+    def label_map(batch: dict) -> dict | None:
+        markers = batch["markers"]
+        if markers.shape[1] < required:
+            return None
+
+        for name, idx in groups.items():
+            batch[name] = markers[:, idx, :].mean(axis=1)
+        return batch
+
+    return label_map
+
+
+def filter_stage(groups: dict = None):
+    """Build a stage that drops frames where any group position is missing.
+
+    Args:
+        groups (dict, optional): groups to check, defaults to DEFAULT_GROUPS.
+    Returns:
+        callable: stage keeping only frames with finite group positions
+    """
+    names = list(groups or DEFAULT_GROUPS)
+
+    def filter_frames(batch: dict) -> dict | None:
+        keep = np.ones(len(batch["frame_numbers"]), dtype=bool)
+        for name in names:
+            keep &= np.isfinite(batch[name]).all(axis=1)
+
+        if not keep.any():
+            return None
+        if keep.all():
+            return batch
+
+        for key, value in batch.items():
+            if isinstance(value, np.ndarray) and len(value) == len(keep):
+                batch[key] = value[keep]
+        return batch
+
+    return filter_frames
+
+
+def kinematics_stage():
+    """Build a stage computing the arm geometry used by the plot and calibration.
+
+    Positions are rotated into the plot frame (x, y) -> (y, -x) so swings show vertically.
+
+    Returns:
+        callable: stage adding ``<arm>_shoulder_xy``, ``<arm>_com_xy`` and ``<arm>_arm_length``
+    """
+
+    def kinematics(batch: dict) -> dict:
+        for arm in ARMS:
+            shoulder = batch[f"{arm}_shoulder"]
+            com = batch[f"{arm}_com"]
+            batch[f"{arm}_shoulder_xy"] = np.stack((shoulder[:, 1], -shoulder[:, 0]), axis=1)
+            batch[f"{arm}_com_xy"] = np.stack((com[:, 1], -com[:, 0]), axis=1)
+            batch[f"{arm}_arm_length"] = np.linalg.norm(com - shoulder, axis=1)
+        return batch
+
+    return kinematics
+
+
+def analytics_stage():
+    """Build a stage computing calibration values from the latest frame of the batch.
+
+    Returns:
+        callable: stage adding a ``calibration`` dict
+    """
+
+    def analytics(batch: dict) -> dict:
+        left_arm_length = float(batch["left_arm_length"][-1])
+        right_arm_length = float(batch["right_arm_length"][-1])
+
+        # Offset of the center of mass from the shoulder, along the plot x axis.
+        left_offset = batch["left_com_xy"][-1, 0] - batch["left_shoulder_xy"][-1, 0]
+        right_offset = batch["right_com_xy"][-1, 0] - batch["right_shoulder_xy"][-1, 0]
+
+        batch["calibration"] = {
+            "left_arm_length": left_arm_length,
+            "right_arm_length": right_arm_length,
+            "arm_length": (left_arm_length + right_arm_length) / 2,
+            "left_offset": float(left_offset),
+            "right_offset": float(right_offset),
+        }
+        return batch
+
+    return analytics
+
+
+def sink_stage(callback):
+    """Build a stage handing each batch to ``callback``.
+
+    Args:
+        callback (callable): called with the batch; its return value is ignored.
+    """
+
+    def sink(batch: dict) -> dict:
+        callback(batch)
+        return batch
+
+    return sink
+
+
+STAGES = {
+    "decode": decode_stage,
+    "sequence": sequence_stage,
+    "label_map": label_map_stage,
+    "filter": filter_stage,
+    "kinematics": kinematics_stage,
+    "analytics": analytics_stage,
+    "sink": sink_stage,
+}
+
+
+# Stages whose outputs each stage reads; they must run before it.
+REQUIRES = {
+    "sequence": ("decode",),
+    "label_map": ("decode",),
+    "filter": ("label_map",),
+    "kinematics": ("label_map",),
+    "analytics": ("kinematics",),
+}
+
+
+def register_stage(name: str, factory, requires: tuple = ()):
+    """Make a stage factory available to configs under ``name``.
+
+    Args:
+        name (str): stage name used in configs.
+        factory (callable): builds the stage from the entry's ``params``.
+        requires (tuple, optional): stages that must run earlier in the pipeline.
+    """
+    STAGES[name] = factory
+    REQUIRES[name] = tuple(requires)
+
+
+def check_config(config: list):
+    """Reject configs naming unknown stages or running a stage before its inputs exist.
+
+    Raises:
+        ValueError: naming the offending stage.
+    """
+    seen = set()
+    for entry in config:
+        name = entry["stage"]
+        if name not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {name}")
+        missing = [stage for stage in REQUIRES.get(name, ()) if stage not in seen]
+        if missing:
+            raise ValueError(
+                f"Pipeline stage {name!r} needs {', '.join(map(repr, missing))} "
+                "earlier in the pipeline"
+            )
+        seen.add(name)
+
+
+def load_config(path: str = None) -> list:
+    """Load a pipeline config from a JSON file, falling back to DEFAULT_CONFIG.
+
+    Args:
+        path (str, optional): JSON file, defaults to the PIPELINE_CONFIG env variable.
+    Returns:
+        list: stage declarations
+    """
+    path = path or PIPELINE_CONFIG
+    if not path:
+        return [dict(entry) for entry in DEFAULT_CONFIG]
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class Pipeline:
+    """Runs batches through a chain of stages and records per-stage timings.
+
+    Sinks always run in the thread that submits batches, so they may drive a GUI even when
+    earlier stages are threaded.
+    """
+
+    def __init__(
+        self, stages: list, sinks: list = (), queue_size: int = PIPELINE_QUEUE_SIZE
+    ):
+        """
+        Args:
+            stages (list): ``(name, stage, threaded)`` tuples in execution order.
+            sinks (list, optional): ``(name, sink)`` tuples run after the last stage.
+            queue_size (int, optional): bound for the queue in front of each threaded stage.
+        """
+        self.names = [name for name, _, _ in stages] + [name for name, _ in sinks]
+        self._timings = {name: [0, 0.0, 0.0] for name in self.names}
+        self._lock = threading.Lock()
+
+        # Split the chain into segments: the first runs in the caller's thread, every
+        # threaded stage starts a new segment run by its own worker.
+        self._segments = [[None, []]]
+        for name, stage, threaded in stages:
+            if threaded:
+                self._segments.append([queue.Queue(maxsize=queue_size), []])
+            self._segments[-1][1].append((name, stage))
+
+        # Batches finished by the workers, waiting for the sinks in the caller's thread.
+        self._sinks = list(sinks)
+        self._results = queue.Queue(maxsize=queue_size)
+        self._threads = []
+
+    @property
+    def threaded(self) -> bool:
+        return len(self._segments) > 1
+
+    def start(self):
+        """Start the worker threads of threaded stages."""
+        for i, (stage_queue, _) in enumerate(self._segments):
+            if stage_queue is None:
+                continue
+            thread = threading.Thread(target=self._worker, args=(i,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Finish the queued batches, running their sinks, and stop the worker threads.
+
+        Raises the first exception raised by a stage or sink meanwhile, once every worker
+        has stopped.
+        """
+        error = None
+        stopping = False
+        while self._threads:
+            try:
+                if not stopping:
+                    self._put(self._segments[1][0], _STOP)
+                    stopping = True
+                if self.drain(block=True):
+                    break
+            except Exception as failure:
+                error = error or failure
+
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if error is not None:
+            raise error
+
+    def submit(self, batch: dict) -> dict | None:
+        """Run a batch through the pipeline.
+
+        Without threaded stages the processed batch is returned. Otherwise the batch is
+        handed to the first worker (blocking while its queue is full), the sinks are run
+        for every batch the workers have finished so far, and None is returned. An exception
+        raised by a threaded stage surfaces from a later ``submit`` or from ``stop``.
+        """
+        batch = self._run_segment(0, batch)
+        if not self.threaded:
+            return None if batch is None else self._run_stages(self._sinks, batch)
+
+        if batch is not None:
+            self._put(self._segments[1][0], batch)
+        self.drain()
+        return None
+
+    def drain(self, block: bool = False) -> bool:
+        """Run the sinks on batches finished by the workers, in the calling thread.
+
+        An exception raised by a threaded stage is re-raised here; the batch that caused it
+        is dropped and the workers keep running.
+
+        Args:
+            block (bool, optional): wait until the workers have stopped.
+        Returns:
+            bool: True once the workers have stopped
+        """
+        while True:
+            try:
+                batch = self._results.get(block=block)
+            except queue.Empty:
+                return False
+            if batch is _STOP:
+                return True
+            if isinstance(batch, _Failure):
+                raise batch.error
+            self._run_stages(self._sinks, batch)
+
+    def timings(self) -> dict:
+        """Return per-stage call counts and timings in milliseconds."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "total_ms": total * 1000,
+                    "mean_ms": total * 1000 / calls if calls else 0.0,
+                    "max_ms": worst * 1000,
+                }
+                for name, (calls, total, worst) in self._timings.items()
+            }
+
+    def _put(self, stage_queue: queue.Queue, item):
+        # Keep running the sinks while waiting, so a full result queue cannot block the
+        # workers that would free up room in ``stage_queue``. A stage error is raised once
+        # the item is queued, so it is never lost.
+        error = None
+        while True:
+            try:
+                stage_queue.put(item, timeout=0.01)
+                break
+            except queue.Full:
+                try:
+                    self.drain()
+                except Exception as failure:
+                    error = error or failure
+        if error is not None:
+            raise error
+
+    def _run_segment(self, index: int, batch: dict) -> dict | None:
+        return self._run_stages(self._segments[index][1], batch)
+
+    def _run_stages(self, stages: list, batch: dict) -> dict | None:
+        for name, stage in stages:
+            start = time.perf_counter()
+            batch = stage(batch)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                timing = self._timings[name]
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+
+            if batch is None:
+                return None
+
+            if trace.ENABLED and "frame_numbers" in batch:
+                # Correlate the stage with the newest frame of the batch.
+                frame = int(batch["frame_numbers"][-1])
+                trace.record(f"pipeline.{name}", start, elapsed, frame)
+                trace.set_frame(frame)
+        return batch
+
+    def _worker(self, index: int):
+        stage_queue = self._segments[index][0]
+        next_queue = (
+            self._segments[index + 1][0]
+            if index + 1 < len(self._segments)
+            else self._results
+        )
+        try:
+            while True:
+                batch = stage_queue.get()
+                if batch is _STOP:
+                    return
+                if not isinstance(batch, _Failure):
+                    try:
+                        batch = self._run_segment(index, batch)
+                    except Exception as error:
+                        # Hand the error to the caller's thread instead of dying silently.
+                        batch = _Failure(error)
+                if batch is not None:
+                    next_queue.put(batch)
+        finally:
+            next_queue.put(_STOP)
+
+
+def build_pipeline(
+    config: list = None, logger: logging.Logger = None, **sinks
+) -> Pipeline:
+    """Build a pipeline from stage declarations.
+
+    Sink stages, whether declared in the config or passed as keywords, always run in the
+    thread calling ``Pipeline.submit``.
+
+    Args:
+        config (list, optional): stage declarations, defaults to ``load_config()``.
+        logger (logging.Logger, optional): passed to stages that accept one.
+        **sinks: callbacks appended as sink stages, in keyword order.
+    Returns:
+        Pipeline: the configured (not yet started) pipeline
+    Raises:
+        ValueError: if the config fails ``check_config``.
+    """
+    config = load_config() if config is None else config
+    check_config(config)
+
+    stages = []
+    sink_stages = []
+    for entry in config:
+        name = entry["stage"]
+        params = dict(entry.get("params", {}))
+        if name in ("decode", "sequence"):
+            params.setdefault("logger", logger)
+        stage = STAGES[name](**params)
+        if name == "sink":
+            sink_stages.append((entry.get("name", name), stage))
+        else:
+            stages.append((entry.get("name", name), stage, entry.get("threaded", False)))
+
+    for name, callback in sinks.items():
+        sink_stages.append((name, sink_stage(callback)))
+
+    return Pipeline(stages, sink_stages)
+
+
+def read_messages(
+    socket: zmq.Socket, batch_size: int = PIPELINE_BATCH_SIZE
+) -> list[bytes]:
+    """Block for one message, then take whatever else is queued, up to ``batch_size``.
+
+    Returns:
+        list[bytes]: raw messages in arrival order
+    """
+    messages = [socket.recv()]
+    while len(messages) < batch_size:
+        try:
+            messages.append(socket.recv(flags=zmq.NOBLOCK))
+        except zmq.Again:
+            break
+    return messages
+
+
+def run_pipeline(
+    pipeline: Pipeline,
+    socket: zmq.Socket,
+    batch_size: int = PIPELINE_BATCH_SIZE,
+):
+    """Feed messages from ``socket`` into ``pipeline`` until interrupted."""
+    if pipeline.threaded:
+        pipeline.start()
+    try:
+        while True:
+            pipeline.submit({"messages": read_messages(socket, batch_size)})
+    finally:
+        pipeline.stop()
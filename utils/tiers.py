@@ -0,0 +1,310 @@
+"""Stream tiers published from a single ingest for subscribers with different bandwidth.
+
+- ``full``: every frame as JSON at full precision (the original stream).
+- ``decimated``: every ``DECIMATION_FACTOR``-th frame as JSON.
+- ``compact``: positions quantized to int16, delta-encoded against the previous frame and
+  optionally compressed, for remote observers on slow or unreliable links.
+
+Each tier has its own PUB endpoint and each frame is encoded once per tier, however many
+subscribers are connected.
+"""
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+import zmq
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Comma separated list of tiers to publish.
+STREAM_TIERS = os.environ.get("STREAM_TIERS", "full")
+DECIMATED_BIND = os.environ.get("DECIMATED_BIND", "tcp://*:5556")
+DECIMATION_FACTOR = int(os.environ.get("DECIMATION_FACTOR", "4"))
+COMPACT_BIND = os.environ.get("COMPACT_BIND", "tcp://*:5557")
+COMPACT_DECIMATION = int(os.environ.get("COMPACT_DECIMATION", "1"))
+# Quantization step in millimetres; 0.1 mm covers +/- 3.27 m in int16.
+COMPACT_SCALE = float(os.environ.get("COMPACT_SCALE", "0.1"))
+COMPACT_CODEC = os.environ.get("COMPACT_CODEC", "zlib")
+# Frames between keyframes, so late joiners and lossy links resynchronize.
+COMPACT_KEYFRAME_INTERVAL = int(os.environ.get("COMPACT_KEYFRAME_INTERVAL", "40"))
+
+COMPACT_VERSION = 1
+# version, flags, frame_number, base_frame, frame_step, marker_count, scale, timestamp
+HEADER = struct.Struct("<BBIIHHfd")
+KEYFRAME = 0x01
+MISSING = -32768
+CODECS = ("none", "zlib", "lz4", "zstd")
+
+
+def _compress(codec: str, payload: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(payload, 1)
+    if codec == "lz4":
+        return lz4.frame.compress(payload)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=1).compress(payload)
+    return payload
+
+
+def _decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "lz4":
+        return lz4.frame.decompress(payload)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
+
+
+def available_codec(codec: str) -> str:
+    """Return ``codec`` if its library is installed, otherwise fall back to zlib."""
+    if codec == "lz4" and lz4 is None or codec == "zstd" and zstandard is None:
+        print(f"Compression codec {codec} is not installed, using zlib")
+        return "zlib"
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    return codec
+
+
+def _positions(markers) -> np.ndarray:
+    """Return ``(markers, 3)`` float positions from marker rows, which may be empty."""
+    markers = np.asarray(markers, dtype=float)
+    if markers.size == 0:
+        return np.empty((0, 3))
+    return markers[:, :3]
+
+
+class CompactEncoder:
+    """Quantizes marker positions to int16 and delta-encodes them between keyframes."""
+
+    def __init__(
+        self,
+        scale: float = COMPACT_SCALE,
+        codec: str = COMPACT_CODEC,
+        keyframe_interval: int = COMPACT_KEYFRAME_INTERVAL,
+    ):
+        self.scale = scale
+        self.codec = available_codec(codec)
+        self.keyframe_interval = keyframe_interval
+        self._previous = None
+        self._previous_frame = 0
+        self._since_keyframe = 0
+
+    def encode(
+        self,
+        frame_number: int,
+        markers: np.ndarray,
+        frame_step: int = None,
+        timestamp: float = None,
+    ) -> bytes:
+        """Encode one frame.
+
+        Args:
+            frame_number (int): frame number of the markers.
+            markers (np.ndarray): ``(markers, 3)`` positions in millimetres, NaN when missing.
+                Markers with a coordinate outside the int16 range of ``scale`` are sent as
+                missing rather than clipped.
+            frame_step (int, optional): stride between published frame numbers.
+            timestamp (float, optional): capture time of the frame in seconds.
+        Returns:
+            bytes: header followed by the (compressed) int16 payload
+        """
+        scaled = np.round(np.nan_to_num(markers) / self.scale)
+        # Clipping would publish wrong positions; out of range markers are dropped instead.
+        invalid = ~np.isfinite(markers) | (np.abs(scaled) > 32767)
+        missing = np.broadcast_to(invalid.any(axis=1, keepdims=True), invalid.shape)
+        quantized = np.where(missing, 0, scaled).astype(np.int16)
+        quantized[missing] = MISSING
+
+        previous = self._previous
+        keyframe = (
+            previous is None
+            or previous.shape != quantized.shape
+            or self._since_keyframe >= self.keyframe_interval
+            or not np.array_equal(previous == MISSING, missing)
+        )
+        if not keyframe:
+            delta = quantized.astype(np.int32) - previous
+            keyframe = np.abs(delta).max(initial=0) > 32767
+
+        if keyframe:
+            payload = quantized
+            self._since_keyframe = 0
+        else:
+            payload = delta.astype(np.int16)
+            self._since_keyframe += 1
+
+        header = HEADER.pack(
+            COMPACT_VERSION,
+            (KEYFRAME if keyframe else 0) | CODECS.index(self.codec) << 4,
+            frame_number,
+            self._previous_frame,
+            frame_step or 0,
+            len(quantized),
+            self.scale,
+            np.nan if timestamp is None else timestamp,
+        )
+        self._previous = quantized.astype(np.int32)
+        self._previous_frame = frame_number
+
+        return header + _compress(self.codec, payload.tobytes())
+
+
+class CompactDecoder:
+    """Rebuilds marker frames from the compact tier.
+
+    Delta frames can only be decoded on top of the frame they were encoded against, so
+    after a dropped message the decoder skips frames until the next keyframe.
+    """
+
+    def __init__(self):
+        self._previous = None
+        self._previous_frame = None
+
+    def decode(self, message: bytes) -> dict | None:
+        """Decode one message.
+
+        Returns:
+            dict | None: ``{"frame_number", "frame_step", "timestamp", "markers"}`` with
+                markers as a ``(markers, 3)`` array, or None while waiting for a keyframe
+        Raises:
+            ValueError: if the message is truncated or corrupt.
+        """
+        if len(message) < HEADER.size:
+            raise ValueError(f"Truncated compact message: {len(message)} bytes")
+
+        version, flags, frame_number, base_frame, frame_step, count, scale, timestamp = (
+            HEADER.unpack_from(message)
+        )
+        if version != COMPACT_VERSION:
+            raise ValueError(f"Unsupported compact stream version: {version}")
+        if flags >> 4 >= len(CODECS):
+            raise ValueError(f"Unknown compact stream codec: {flags >> 4}")
+
+        try:
+            payload = _decompress(CODECS[flags >> 4], message[HEADER.size :])
+        except Exception as error:  # zlib.error, lz4's RuntimeError, zstandard.ZstdError
+            raise ValueError(f"Corrupt compact payload: {error}") from error
+        if len(payload) != count * 3 * 2:
+            raise ValueError(f"Compact payload does not hold {count} markers")
+        values = np.frombuffer(payload, dtype=np.int16).reshape(count, 3)
+
+        if flags & KEYFRAME:
+            quantized = values.astype(np.int32)
+        elif self._previous_frame == base_frame and self._previous.shape == values.shape:
+            quantized = self._previous + values
+        else:
+            self._previous = None
+            self._previous_frame = None
+            return None
+
+        self._previous = quantized
+        self._previous_frame = frame_number
+
+        markers = quantized * scale
+        markers[quantized == MISSING] = np.nan
+
+        rt_data = {"frame_number": frame_number, "markers": markers}
+        if frame_step:
+            rt_data["frame_step"] = frame_step
+        if not np.isnan(timestamp):
+            rt_data["timestamp"] = timestamp
+        return rt_data
+
+
+def encode_json(
+    frame_number: int, markers, frame_step: int = None, timestamp: float = None
+) -> str:
+    """Encode one frame for the JSON tiers."""
+    if isinstance(markers, np.ndarray):
+        markers = _positions(markers).tolist()
+
+    rt_data = {"frame_number": frame_number, "markers": markers}
+    if frame_step:
+        rt_data["frame_step"] = frame_step
+    if timestamp is not None:
+        rt_data["timestamp"] = timestamp
+    return json.dumps(rt_data)
+
+
+class TierPublisher:
+    """Publishes every configured tier from a single stream of frames."""
+
+    def __init__(
+        self,
+        context: zmq.Context,
+        full_bind: str,
+        tiers: str = STREAM_TIERS,
+        frame_step: int = None,
+    ):
+        """
+        Args:
+            context (zmq.Context): context used to create the PUB sockets.
+            full_bind (str): endpoint of the full tier.
+            tiers (str, optional): comma separated tier names.
+            frame_step (int, optional): stride of the incoming frame numbers, when known.
+        """
+        self.frame_step = frame_step
+        self.count = 0
+        self._tiers = []
+
+        names = [name.strip() for name in tiers.split(",") if name.strip()]
+        for name in names:
+            if name == "full":
+                self._add(context, name, full_bind, 1, self._encode_json)
+            elif name == "decimated":
+                self._add(context, name, DECIMATED_BIND, DECIMATION_FACTOR, self._encode_json)
+            elif name == "compact":
+                encoder = CompactEncoder()
+                self._add(
+                    context,
+                    name,
+                    COMPACT_BIND,
+                    COMPACT_DECIMATION,
+                    lambda frame, markers, step, timestamp: encoder.encode(
+                        frame, _positions(markers), step, timestamp
+                    ),
+                )
+            else:
+                raise ValueError(f"Unknown stream tier: {name}")
+
+    def _add(self, context, name, bind, decimation, encode):
+        socket = context.socket(zmq.PUB)
+        socket.bind(bind)
+        print(f"Publishing {name} tier on {bind}")
+        self._tiers.append((socket, decimation, encode))
+
+    def _encode_json(self, frame_number, markers, frame_step, timestamp):
+        return encode_json(frame_number, markers, frame_step, timestamp).encode()
+
+    def publish(self, frame_number: int, markers, timestamp: float = None):
+        """Encode and send one frame on every tier due for it.
+
+        Args:
+            frame_number (int): frame number of the markers.
+            markers (list | np.ndarray): marker positions, one ``[x, y, z, ...]`` row each.
+            timestamp (float, optional): capture time of the frame in seconds, used by
+                ``aggregator.py`` to align sources.
+        """
+        for socket, decimation, encode in self._tiers:
+            if self.count % decimation:
+                continue
+
+            frame_step = self.frame_step * decimation if self.frame_step else None
+            socket.send(encode(frame_number, markers, frame_step, timestamp))
+        self.count += 1
+
+    def close(self):
+        for socket, _, _ in self._tiers:
+            socket.close()
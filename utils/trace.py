@@ -0,0 +1,197 @@
+"""Opt-in span tracing for the server and clients, written as Chrome trace JSON.
+
+Set ``QUALISYS_TRACE=1`` to record spans around the hot paths (QTM callback, message
+decoding, pipeline stages, blitting). Each process writes ``<TRACE_DIR>/<script>_<pid>.json``
+which opens in Perfetto (https://ui.perfetto.dev) or ``chrome://tracing``. Every span carries
+the frame number in ``args.frame``, and timestamps share the wall clock, so traces from the
+server and clients can be merged to follow one frame from the QTM callback to the screen::
+
+    python -m utils.trace merged.json traces/*.json
+
+With tracing off, ``span`` returns a shared no-op context manager and ``traced`` returns the
+function unchanged, so the instrumentation can stay in production code.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+QUALISYS_TRACE = os.environ.get("QUALISYS_TRACE", "")
+TRACE_DIR = os.environ.get("TRACE_DIR", "./traces")
+# Events buffered in memory before being appended to the trace file.
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", "10000"))
+
+ENABLED = QUALISYS_TRACE not in ("", "0")
+
+# Offset from perf_counter() to the wall clock, so timestamps line up across processes.
+_EPOCH = time.time() - time.perf_counter()
+_PID = os.getpid()
+
+_events = []
+_lock = threading.Lock()
+_file = None
+
+# Frame being processed, used by spans that do not know their frame themselves.
+current_frame = None
+
+
+def set_frame(frame_number: int):
+    """Set the frame that following spans without an explicit frame belong to."""
+    global current_frame
+    current_frame = frame_number
+
+
+def record(name: str, start: float, elapsed: float, frame: int = None):
+    """Record a span measured elsewhere.
+
+    Args:
+        name (str): span name.
+        start (float): ``time.perf_counter()`` at the start of the span.
+        elapsed (float): duration in seconds.
+        frame (int, optional): frame number, defaults to ``current_frame``.
+    """
+    frame = current_frame if frame is None else frame
+    event = (name, start, elapsed, threading.get_ident(), frame)
+    # Pipeline workers record concurrently with flush swapping the buffer.
+    with _lock:
+        _events.append(event)
+        full = len(_events) >= TRACE_BUFFER
+    if full:
+        flush()
+
+
+class _Span:
+    __slots__ = ("name", "frame", "start")
+
+    def __init__(self, name: str, frame: int = None):
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter() - self.start, self.frame)
+
+
+class _NullSpan:
+    """Shared no-op span; attribute writes (e.g. ``frame``) are accepted and ignored."""
+
+    frame = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, frame: int = None):
+    """Context manager timing a block. Set ``.frame`` on it if the frame is known later."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, frame)
+
+
+def traced(name: str = None):
+    """Decorator timing every call of a function; a no-op when tracing is off."""
+
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(label, start, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_path() -> str:
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+    return os.path.join(TRACE_DIR, f"{script}_{_PID}.json")
+
+
+def _event(name, start, elapsed, tid, frame) -> dict:
+    return {
+        "name": name,
+        "ph": "X",
+        "ts": (_EPOCH + start) * 1e6,
+        "dur": elapsed * 1e6,
+        "pid": _PID,
+        "tid": tid,
+        "args": {"frame": frame},
+    }
+
+
+def flush():
+    """Append buffered events to this process's trace file."""
+    global _file, _events
+    with _lock:
+        events, _events = _events, []
+        if not events:
+            return
+
+        if _file is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            # JSON array format: the closing bracket is optional, so the file stays
+            # loadable even if the process is killed.
+            _file = open(trace_path(), "w")
+            _file.write("[\n")
+        _file.writelines(json.dumps(_event(*event)) + ",\n" for event in events)
+        _file.flush()
+
+
+def close():
+    """Flush remaining events and terminate the trace file."""
+    global _file
+    flush()
+    with _lock:
+        if _file is not None:
+            _file.write("{}]\n")
+            _file.close()
+            _file = None
+
+
+def merge(output: str, paths: list[str]):
+    """Merge trace files from several processes into one Chrome trace."""
+    events = []
+    for path in paths:
+        with open(path, "r") as f:
+            text = f.read().rstrip().rstrip(",")
+        if not text.endswith("]"):
+            text += "]"
+        events.extend(event for event in json.loads(text) if event)
+
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+if ENABLED:
+    atexit.register(close)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m utils.trace OUTPUT TRACE [TRACE ...]")
+        exit(1)
+    merge(sys.argv[1], sys.argv[2:])
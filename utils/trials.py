@@ -0,0 +1,211 @@
+"""Whole-trial C3D preprocessing and indexing for instant seek.
+
+A trial is read once, preprocessed with vectorized NumPy over the full recording and
+cached next to the C3D file as ``<name>.index.npz``. The cache holds the marker positions
+together with the index: per-frame marker validity, NaN gap spans, swing peaks and cycles.
+Later loads skip the C3D parser entirely, and frames, cycles or time ranges map to array
+slices in O(1).
+"""
+
+import os
+import warnings
+
+import c3d
+import numpy as np
+
+from utils.labels import (
+    RIGHT_COM_LABELS,
+    RIGHT_SHOULDER_LABELS,
+)
+
+# Cache format version; bump when the stored arrays change.
+INDEX_VERSION = 1
+# Swing peaks must exceed the mean by this many standard deviations of the swing signal.
+PEAK_THRESHOLD = float(os.environ.get("TRIAL_PEAK_THRESHOLD", "0.5"))
+
+
+def index_path(c3d_path: str) -> str:
+    """Return the cache file used for ``c3d_path``."""
+    return os.path.splitext(c3d_path)[0] + ".index.npz"
+
+
+def read_c3d(c3d_path: str) -> tuple:
+    """Read every frame of a C3D file.
+
+    Returns:
+        tuple: (points ``(frames, markers, 5)``, first frame number, point rate)
+    """
+    with open(c3d_path, "rb") as c3d_file:
+        reader = c3d.Reader(c3d_file)
+        points = np.stack([frame for _, frame, _ in reader.read_frames()])
+        return points, reader.first_frame, float(reader.point_rate)
+
+
+def gap_spans(valid: np.ndarray) -> np.ndarray:
+    """Find runs of invalid frames for every marker.
+
+    Args:
+        valid (np.ndarray): ``(frames, markers)`` validity mask.
+    Returns:
+        np.ndarray: ``(gaps, 3)`` rows of (marker, first frame index, end frame index),
+            end exclusive, sorted by marker
+    """
+    frames, markers = valid.shape
+    padded = np.ones((frames + 2, markers), dtype=np.int8)
+    padded[1:-1] = valid
+    edges = np.diff(padded, axis=0)
+
+    start_frame, start_marker = np.nonzero(edges.T == -1)[::-1]
+    end_frame, _ = np.nonzero(edges.T == 1)[::-1]
+    return np.stack((start_marker, start_frame, end_frame), axis=1).astype(np.int64)
+
+
+def fill_gaps(signal: np.ndarray) -> np.ndarray:
+    """Linearly interpolate over NaN samples of a 1D signal."""
+    missing = np.isnan(signal)
+    if not missing.any() or missing.all():
+        return signal
+
+    samples = np.arange(len(signal))
+    filled = signal.copy()
+    filled[missing] = np.interp(samples[missing], samples[~missing], signal[~missing])
+    return filled
+
+
+def detect_peaks(signal: np.ndarray, threshold: float = PEAK_THRESHOLD) -> np.ndarray:
+    """Find one peak per excursion of ``signal`` above ``mean + threshold * std``.
+
+    Returns:
+        np.ndarray: frame indices of the peaks
+    """
+    above = signal > np.nanmean(signal) + threshold * np.nanstd(signal)
+    edges = np.diff(np.concatenate(([False], above, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    if len(starts) == 0:
+        return starts
+
+    # Maximum of each excursion, found with one pass over the concatenated runs.
+    run_max = np.maximum.reduceat(np.where(above, signal, -np.inf), starts)
+    run_id = np.cumsum(edges[:-1] == 1) - 1
+    is_max = above & (signal == run_max[np.clip(run_id, 0, None)])
+    candidates = np.flatnonzero(is_max)
+    first = np.unique(run_id[candidates], return_index=True)[1]
+    return candidates[first]
+
+
+def swing_signal(positions: np.ndarray) -> np.ndarray:
+    """Forward displacement of the right arm center of mass from the shoulder.
+
+    Uses the plot orientation, where a forward swing is positive y (raw -x). Each group is
+    averaged over its visible markers, so the signal is only missing (and interpolated)
+    when every marker of a group drops out.
+    """
+    with warnings.catch_warnings():
+        # Frames where a whole group is missing are expected; they become NaN.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        shoulder = np.nanmean(positions[:, RIGHT_SHOULDER_LABELS, 0], axis=1)
+        com = np.nanmean(positions[:, RIGHT_COM_LABELS, 0], axis=1)
+    return fill_gaps(-(com - shoulder))
+
+
+def build_index(points: np.ndarray, first_frame: int, rate: float) -> dict:
+    """Preprocess a whole trial.
+
+    Args:
+        points (np.ndarray): ``(frames, markers, 5)`` C3D points (x, y, z, residual, cameras).
+        first_frame (int): frame number of the first row.
+        rate (float): point rate in Hz.
+    Returns:
+        dict: arrays stored in the index cache
+    """
+    positions = np.ascontiguousarray(points[:, :, :3], dtype=np.float64)
+    valid = (points[:, :, 3] >= 0) & np.isfinite(positions).all(axis=2)
+
+    signal = swing_signal(np.where(valid[:, :, None], positions, np.nan))
+    forward_peaks = detect_peaks(signal)
+    backward_peaks = detect_peaks(-signal)
+
+    # A cycle runs from one forward peak to the next.
+    cycles = np.stack((forward_peaks[:-1], forward_peaks[1:]), axis=1).reshape(-1, 2)
+
+    return {
+        "version": np.int64(INDEX_VERSION),
+        "first_frame": np.int64(first_frame),
+        "rate": np.float64(rate),
+        "positions": positions,
+        "valid": valid,
+        "gaps": gap_spans(valid),
+        "forward_peaks": forward_peaks,
+        "backward_peaks": backward_peaks,
+        "cycles": cycles,
+    }
+
+
+class TrialIndex:
+    """Preprocessed trial with O(1) seeking by frame, cycle or time."""
+
+    def __init__(self, arrays: dict):
+        self.first_frame = int(arrays["first_frame"])
+        self.rate = float(arrays["rate"])
+        self.positions = arrays["positions"]
+        self.valid = arrays["valid"]
+        self.gaps = arrays["gaps"]
+        self.forward_peaks = arrays["forward_peaks"]
+        self.backward_peaks = arrays["backward_peaks"]
+        self.cycles = arrays["cycles"]
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def frame_number(self, index: int) -> int:
+        return self.first_frame + index
+
+    def frame_index(self, frame_number: int) -> int:
+        """Row of ``frame_number``, clamped to the trial."""
+        return min(max(frame_number - self.first_frame, 0), len(self))
+
+    def time_index(self, seconds: float) -> int:
+        """Row recorded ``seconds`` after the start of the trial, clamped to the trial."""
+        return min(max(int(round(seconds * self.rate)), 0), len(self))
+
+    def cycle_range(self, cycle: int) -> tuple:
+        """Rows ``(start, end)`` of swing cycle ``cycle`` (negative counts from the end)."""
+        start, end = self.cycles[cycle]
+        return int(start), int(end)
+
+    def frames(self, start: int, end: int = None) -> tuple:
+        """Frame numbers, positions and validity for rows ``start:end`` (views of the trial)."""
+        start, end, _ = slice(start, end).indices(len(self))
+        frame_numbers = np.arange(self.first_frame + start, self.first_frame + end)
+        return frame_numbers, self.positions[start:end], self.valid[start:end]
+
+    def marker_gaps(self, marker: int) -> np.ndarray:
+        """``(start, end)`` rows of the gaps of one marker."""
+        rows = np.searchsorted(self.gaps[:, 0], [marker, marker + 1])
+        return self.gaps[rows[0] : rows[1], 1:]
+
+
+def load_trial(c3d_path: str, rebuild: bool = False) -> TrialIndex:
+    """Load a trial, building and caching its index on first use.
+
+    The cache is rebuilt when the C3D file is newer than it or the format changed.
+
+    Args:
+        c3d_path (str): path to the C3D file.
+        rebuild (bool, optional): ignore any existing cache.
+    Returns:
+        TrialIndex: the indexed trial
+    """
+    cache = index_path(c3d_path)
+    if (
+        not rebuild
+        and os.path.exists(cache)
+        and os.path.getmtime(cache) >= os.path.getmtime(c3d_path)
+    ):
+        with np.load(cache) as data:
+            if int(data["version"]) == INDEX_VERSION:
+                return TrialIndex({key: data[key] for key in data.files})
+
+    arrays = build_index(*read_c3d(c3d_path))
+    np.savez(cache, **arrays)
+    return TrialIndex(arrays)